@@ -3,6 +3,11 @@
 
 STACK_FILE="$HOME/.cache/i3-window-stack.json"
 
+# Camino rápido: window-tracker.py responde desde memoria (un round-trip)
+"$HOME/.config/i3/tracker-client.py" kill-newest > /dev/null 2>&1
+[ $? -ne 2 ] && exit 0
+
+# Fallback sin daemon: leer el stack desde disco
 # Obtener workspace actual
 current_ws=$(i3-msg -t get_workspaces | jq -r '.[] | select(.focused==true).name')
 
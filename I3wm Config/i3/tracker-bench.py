@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Benchmark de window-tracker.py sin sesión de i3.
+
+Levanta un i3 falso que habla el protocolo IPC real (cabecera "i3-ipc",
+tipos de mensaje, subscribe y eventos con el bit alto), arranca el tracker
+apuntando a él (I3SOCK y HOME temporales) y reproduce una traza de eventos.
+Al final informa eventos/segundo, latencias por tipo de evento (de la
+consulta "status" del tracker), pico de RSS y bytes escritos.
+
+Uso: tracker-bench.py [--trace restore|move-storm|ws-switch|ARCHIVO.jsonl]
+                      [--save resultado.json] [--baseline resultado.json]
+                      [-- argumentos del tracker, ej. --async --journal]
+
+Una traza grabada es un JSONL con una operación por línea:
+  {"op": "new", "id": 7, "ws": "2"}     {"op": "close", "id": 7}
+  {"op": "move", "id": 7, "ws": "3"}    {"op": "focus", "ws": "3"}
+  {"op": "focus", "id": 7}              {"op": "binding", "command": "nop tracker close-newest"}
+
+Algunas trazas sintéticas ejercitan un plugin y lo activan solas (si no se
+pasa --plugins al tracker). Un error que el tracker escribe en stderr
+("window-tracker: error en ...") cuenta como fallo, igual que un stack
+inconsistente.
+
+Con --baseline sale con código 1 si events/sec o p95 empeoran más que
+--tolerance respecto del resultado guardado.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TRACKER = os.path.join(HERE, "window-tracker.py")
+
+MAGIC = b"i3-ipc"
+HEADER = "=6sII"
+HEADER_SIZE = struct.calcsize(HEADER)
+
+# Mensajes y eventos de i3 (https://i3wm.org/docs/ipc.html)
+RUN_COMMAND, GET_WORKSPACES, SUBSCRIBE, GET_OUTPUTS, GET_TREE = 0, 1, 2, 3, 4
+GET_VERSION = 7
+EVENT_BIT = 1 << 31
+EVENTS = {"workspace": 0, "output": 1, "window": 3, "binding": 5, "shutdown": 6}
+
+OUTPUT = "BENCH-1"
+WORKSPACE_IDS = 1 << 24  # Base de los con_id de workspaces (las ventanas usan ids chicos)
+ROOT_ID, OUTPUT_ID, CONTENT_ID = WORKSPACE_IDS - 3, WORKSPACE_IDS - 2, WORKSPACE_IDS - 1
+RECT = {"x": 0, "y": 0, "width": 1920, "height": 1080}
+
+
+# ==================== I3 FALSO ====================
+
+class FakeI3:
+    """Servidor IPC con el estado mínimo para que el tracker funcione:
+    workspaces con ventanas, workspace enfocado y suscripciones.
+
+    Las operaciones (new, close, move, focus de workspace o de ventana,
+    binding) actualizan el estado y
+    emiten los mismos eventos que emitiría i3, incluidos workspace::init y
+    workspace::empty cuando un workspace aparece o se queda vacío.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.windows = {}        # {con_id: workspace}, en orden de creación
+        self.workspaces = ["1"]  # Existentes, en orden de creación
+        self.ws_ids = {}         # {workspace: con_id}; uno nuevo cada vez que se crea
+        self.next_ws_id = WORKSPACE_IDS
+        self.focused = "1"
+        self.subscribers = {}    # {socket: set de eventos}
+        self.commands = []
+        self.outbox = []         # Eventos de la operación en curso
+        self.events_sent = 0
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def close(self):
+        self.server.close()
+        with self.lock:
+            for conn in self.subscribers:
+                conn.close()
+
+    def subscribed(self, events):
+        """True si alguna conexión ya recibe todos estos eventos"""
+        with self.lock:
+            return any(events <= subscribed for subscribed in self.subscribers.values())
+
+    # ---- protocolo ----
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        try:
+            while True:
+                magic, length, msg_type = struct.unpack(HEADER, recv_exact(conn, HEADER_SIZE))
+                if magic != MAGIC:
+                    return
+                payload = recv_exact(conn, length).decode()
+                with self.lock:
+                    reply = self.reply(conn, msg_type, payload)
+                    send(conn, msg_type, reply)
+        except (EOFError, OSError):
+            with self.lock:
+                self.subscribers.pop(conn, None)
+
+    def reply(self, conn, msg_type, payload):
+        if msg_type == RUN_COMMAND:
+            self.commands.append(payload)
+            return [{"success": True}]
+        if msg_type == GET_WORKSPACES:
+            return [self.workspace_reply(ws) for ws in self.workspaces]
+        if msg_type == SUBSCRIBE:
+            self.subscribers.setdefault(conn, set()).update(json.loads(payload))
+            return {"success": True}
+        if msg_type == GET_OUTPUTS:
+            return [{"name": OUTPUT, "active": True, "primary": True,
+                     "current_workspace": self.focused, "rect": RECT}]
+        if msg_type == GET_TREE:
+            return self.tree()
+        if msg_type == GET_VERSION:
+            return {"major": 4, "minor": 23, "patch": 0, "human_readable": "4.23 (bench)",
+                    "loaded_config_file_name": ""}
+        return {}
+
+    def emit(self, event, payload):
+        """Encola un evento (con self.lock tomado); apply() lo envía al soltar el lock"""
+        self.outbox.append((event, payload))
+
+    def deliver(self, outbox):
+        """Envía los eventos sin self.lock: el tracker puede estar esperando el
+        árbol mientras su socket de eventos está lleno"""
+        with self.lock:
+            subscribers = list(self.subscribers.items())
+        for event, payload in outbox:
+            for conn, events in subscribers:
+                if event in events:
+                    try:
+                        send(conn, EVENT_BIT | EVENTS[event], payload)
+                    except OSError:
+                        with self.lock:
+                            self.subscribers.pop(conn, None)
+            self.events_sent += 1
+
+    # ---- modelo ----
+
+    def ws_id(self, ws):
+        if ws not in self.ws_ids:
+            self.next_ws_id += 1
+            self.ws_ids[ws] = self.next_ws_id
+        return self.ws_ids[ws]
+
+    def ws_num(self, ws):
+        return int(ws) if ws.isdigit() else -1
+
+    def workspace_reply(self, ws):
+        return {"id": self.ws_id(ws), "num": self.ws_num(ws), "name": ws,
+                "visible": ws == self.focused, "focused": ws == self.focused,
+                "urgent": False, "rect": RECT, "output": OUTPUT}
+
+    def window_node(self, con_id):
+        return {"id": con_id, "type": "con", "name": f"bench {con_id}",
+                "window": 0x1000000 + con_id, "rect": RECT, "focused": False,
+                "floating": "auto_off", "urgent": False, "nodes": [], "floating_nodes": [],
+                "window_properties": {"class": "Bench", "instance": "bench",
+                                      "title": f"bench {con_id}"}}
+
+    def workspace_node(self, ws):
+        return {"id": self.ws_id(ws), "type": "workspace", "name": ws, "num": self.ws_num(ws),
+                "output": OUTPUT, "rect": RECT, "floating_nodes": [],
+                "nodes": [self.window_node(c) for c, w in self.windows.items() if w == ws]}
+
+    def tree(self):
+        content = {"id": CONTENT_ID, "type": "con", "name": "content", "rect": RECT, "floating_nodes": [],
+                   "nodes": [self.workspace_node(ws) for ws in self.workspaces]}
+        output = {"id": OUTPUT_ID, "type": "output", "name": OUTPUT, "rect": RECT,
+                  "nodes": [content], "floating_nodes": []}
+        return {"id": ROOT_ID, "type": "root", "name": "root", "rect": RECT,
+                "nodes": [output], "floating_nodes": []}
+
+    def ensure_workspace(self, ws):
+        if ws not in self.workspaces:
+            self.workspaces.append(ws)
+            self.emit("workspace", {"change": "init", "current": self.workspace_node(ws),
+                                    "old": None})
+
+    def drop_if_empty(self, ws):
+        """i3 destruye los workspaces vacíos que no están enfocados"""
+        if ws == self.focused or ws not in self.workspaces or ws in self.windows.values():
+            return
+        node = self.workspace_node(ws)
+        self.emit("workspace", {"change": "empty", "current": node, "old": None})
+        self.workspaces.remove(ws)
+        del self.ws_ids[ws]
+
+    def apply(self, op):
+        """Ejecuta una operación de la traza y emite sus eventos"""
+        with self.lock:
+            self.apply_locked(op)
+            outbox, self.outbox = self.outbox, []
+        self.deliver(outbox)
+
+    def apply_locked(self, op):
+        kind = op["op"]
+        if kind == "new":
+            self.ensure_workspace(op["ws"])
+            self.windows[op["id"]] = op["ws"]
+            self.emit("window", {"change": "new", "container": self.window_node(op["id"])})
+        elif kind == "close":
+            ws = self.windows.pop(op["id"], None)
+            self.emit("window", {"change": "close", "container": self.window_node(op["id"])})
+            if ws:
+                self.drop_if_empty(ws)
+        elif kind == "move":
+            old = self.windows.get(op["id"])
+            if old is None:
+                return
+            self.ensure_workspace(op["ws"])
+            self.windows[op["id"]] = op["ws"]
+            self.emit("window", {"change": "move", "container": self.window_node(op["id"])})
+            self.drop_if_empty(old)
+        elif kind == "focus" and "id" in op:
+            if op["id"] in self.windows:
+                self.emit("window", {"change": "focus", "container": self.window_node(op["id"])})
+        elif kind == "focus":
+            old = self.focused
+            self.ensure_workspace(op["ws"])
+            self.focused = op["ws"]
+            self.emit("workspace", {"change": "focus",
+                                    "current": self.workspace_node(op["ws"]),
+                                    "old": self.workspace_node(old)})
+            self.drop_if_empty(old)
+        elif kind == "binding":
+            self.emit("binding", {"change": "run", "binding": {
+                "command": op["command"], "event_state_mask": [], "input_code": 0,
+                "symbol": "x", "input_type": "keyboard"}})
+        else:
+            raise ValueError(f"operación desconocida: {kind}")
+
+    def snapshot(self):
+        """{workspace: set de con_id} para comparar con el stack del tracker"""
+        with self.lock:
+            result = {}
+            for con_id, ws in self.windows.items():
+                result.setdefault(ws, set()).add(con_id)
+            return result
+
+
+def recv_exact(conn, size):
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+def send(conn, msg_type, obj):
+    payload = json.dumps(obj).encode()
+    conn.sendall(struct.pack(HEADER, MAGIC, len(payload), msg_type) + payload)
+
+
+# ==================== TRAZAS ====================
+
+TRACES = {}
+TRACE_PLUGINS = {}  # {traza: plugins del tracker que necesita}
+TRACE_RATES = {}    # {traza: eventos/s por defecto}
+
+def trace(name, plugins=None, rate=None):
+    """Registra un generador de trazas sintéticas.
+
+    rate: ritmo por defecto para las trazas que siguen a ventanas puntuales;
+    a toda velocidad el i3 falso se adelanta y el árbol que pide el tracker
+    ya no tiene las ventanas de los eventos que está procesando.
+    """
+    def register(func):
+        TRACES[name] = func
+        if plugins:
+            TRACE_PLUGINS[name] = plugins
+        if rate:
+            TRACE_RATES[name] = rate
+        return func
+    return register
+
+@trace("restore")
+def trace_restore(rng, windows=200, workspaces=10):
+    """Restauración de sesión: 200 ventanas repartidas en 10 workspaces"""
+    for con_id in range(1000, 1000 + windows):
+        yield {"op": "new", "id": con_id, "ws": str(rng.randint(1, workspaces))}
+
+@trace("move-storm")
+def trace_move_storm(rng, windows=40, moves=2000):
+    """Autotiling: ráfagas de window::move sobre unas pocas ventanas"""
+    ids = list(range(2000, 2000 + windows))
+    for con_id in ids:
+        yield {"op": "new", "id": con_id, "ws": "1"}
+    for _ in range(moves // 10):
+        con_id = rng.choice(ids)
+        for _ in range(10):  # i3 manda varios move seguidos por cada reacomodo
+            yield {"op": "move", "id": con_id, "ws": str(rng.randint(1, 4))}
+
+@trace("ws-switch")
+def trace_ws_switch(rng, switches=2000, workspaces=10):
+    """Cambio rápido de workspace, con algunas ventanas abiertas y cerradas"""
+    for n in range(1, workspaces + 1):
+        yield {"op": "new", "id": 3000 + n, "ws": str(n)}
+    next_id = 3100
+    for i in range(switches):
+        yield {"op": "focus", "ws": str(rng.randint(1, workspaces))}
+        if i % 20 == 0:
+            yield {"op": "new", "id": next_id, "ws": str(rng.randint(1, workspaces))}
+            next_id += 1
+        elif i % 20 == 10 and next_id > 3100:
+            next_id -= 1
+            yield {"op": "close", "id": next_id}
+
+@trace("mru-evict", plugins="focus-history", rate=500)
+def trace_mru_evict(rng, windows=60, kept=10):
+    """Historial de foco: más ventanas que MRU_SIZE en un workspace, cerrar
+    casi todas y mover y enfocar las que quedan (desalojo seguido de move)"""
+    ids = list(range(4000, 4000 + windows))
+    for con_id in ids:
+        yield {"op": "new", "id": con_id, "ws": "1"}
+        yield {"op": "focus", "id": con_id}
+    for con_id in ids[kept:]:
+        yield {"op": "close", "id": con_id}
+    for con_id in ids[:kept]:
+        yield {"op": "move", "id": con_id, "ws": "2"}
+        yield {"op": "focus", "id": con_id}
+
+def load_trace(spec, seed):
+    if spec in TRACES:
+        return list(TRACES[spec](random.Random(seed)))
+    with open(spec) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ==================== MEDICIÓN ====================
+
+def tracker_query(sock_path, *args):
+    """Consulta al socket del tracker (como tracker-client.py); None si no responde"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(sock_path)
+            sock.sendall((" ".join(args) + "\n").encode())
+            reply = sock.makefile("rb").readline()
+    except OSError:
+        return None
+    return json.loads(reply) if reply else None
+
+def wait_for(condition, timeout, interval=0.01):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(interval)
+    return None
+
+def peak_rss_kb(pid):
+    """VmHWM del proceso (pico de memoria residente)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def events_seen(status):
+    """Eventos procesados, incluidos los window::move que --async fusionó"""
+    return sum(status["events"].values()) + status["coalesced"] if status else 0
+
+def consistent(fake, stack):
+    """El stack del tracker tiene las mismas ventanas por workspace que el i3 falso"""
+    expected = fake.snapshot()
+    got = {ws: set(ids) for ws, ids in stack.items() if ids}
+    return got == expected
+
+def run(trace_ops, tracker_args, rate, timeout):
+    workdir = tempfile.mkdtemp(prefix="tracker-bench.")
+    home = os.path.join(workdir, "home")
+    runtime = os.path.join(workdir, "run")
+    os.makedirs(os.path.join(home, ".cache"))
+    os.makedirs(runtime, mode=0o700)
+    i3_sock = os.path.join(workdir, "i3.sock")
+    tracker_sock = os.path.join(runtime, "i3-window-tracker.sock")
+
+    fake = FakeI3(i3_sock)
+    env = dict(os.environ, I3SOCK=i3_sock, HOME=home, XDG_RUNTIME_DIR=runtime)
+    log = open(os.path.join(workdir, "tracker.log"), "w+")
+    proc = subprocess.Popen([sys.executable, TRACKER, *tracker_args], env=env, stderr=log)
+    try:
+        if not wait_for(lambda: tracker_query(tracker_sock, "status"), 10):
+            raise RuntimeError("el tracker no arrancó")
+        # El socket de consultas abre antes que la suscripción a i3: lo que se
+        # emita en ese hueco no le llega y la espera de abajo nunca terminaría
+        if not wait_for(lambda: fake.subscribed({"window", "workspace"}), 10):
+            raise RuntimeError("el tracker no se suscribió a los eventos")
+        baseline = events_seen(tracker_query(tracker_sock, "status"))
+
+        start = time.perf_counter()
+        for op in trace_ops:
+            fake.apply(op)
+            if rate:
+                time.sleep(1 / rate)
+        sent = fake.events_sent
+        sent_done = time.perf_counter()
+
+        # Terminado cuando el tracker contó todos los eventos emitidos
+        status = wait_for(lambda: (lambda s: s if events_seen(s) - baseline >= sent else None)(
+            tracker_query(tracker_sock, "status")), timeout)
+        if status is None:
+            raise RuntimeError("el tracker no procesó todos los eventos a tiempo")
+        elapsed = time.perf_counter() - start
+
+        # Dejar que corra la escritura diferida antes de contar bytes
+        time.sleep(0.5)
+        status = tracker_query(tracker_sock, "status")
+        stack = tracker_query(tracker_sock, "stack", "*")["stack"]
+        rss = peak_rss_kb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+        fake.close()
+        # El stderr del tracker se muestra igual; los errores de plugins cuentan como fallo
+        log.seek(0)
+        output = log.read()
+        log.close()
+        sys.stderr.write(output)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "events": sent,
+        "seconds": round(elapsed, 4),
+        "send_seconds": round(sent_done - start, 4),
+        "events_per_sec": round(sent / elapsed, 1),
+        "latency": status["latency"],
+        "queue_depth_max": status["queue_depth_max"],
+        "coalesced": status["coalesced"],
+        "flushes": status["flush"]["count"],
+        "bytes_written": status["bytes_written"],
+        "peak_rss_kb": rss,
+        "consistent": consistent(fake, stack),
+        "errors": [line for line in output.splitlines()
+                   if line.startswith("window-tracker: error")],
+    }
+
+
+# ==================== REPORTE ====================
+
+def worst_p95(result):
+    return max((lat.get("p95", 0) for lat in result["latency"].values()), default=0)
+
+def print_report(name, result):
+    print(f"traza {name}: {result['events']} eventos en {result['seconds']} s "
+          f"({result['events_per_sec']} eventos/s)")
+    print(f"  {'evento':<22}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for event, lat in sorted(result["latency"].items()):
+        print(f"  {event:<22}{lat['count']:>7}"
+              + "".join(f"{lat.get(p, 0) * 1000:>10.3f}" for p in ("p50", "p95", "p99")))
+    print(f"  cola máx {result['queue_depth_max']}, moves fusionados {result['coalesced']}")
+    print(f"  escrituras {result['flushes']}, bytes escritos {result['bytes_written']}, "
+          f"pico RSS {result['peak_rss_kb']} kB")
+    if not result["consistent"]:
+        print("  ¡el stack final no coincide con el árbol del i3 falso!")
+    for error in result["errors"]:
+        print(f"  ERROR: {error}")
+
+def regressions(result, baseline, tolerance):
+    """Lista de empeoramientos respecto de un resultado guardado"""
+    problems = []
+    if result["events_per_sec"] < baseline["events_per_sec"] * (1 - tolerance):
+        problems.append(f"eventos/s {result['events_per_sec']} < {baseline['events_per_sec']}")
+    if worst_p95(result) > worst_p95(baseline) * (1 + tolerance):
+        problems.append(f"p95 {worst_p95(result) * 1000:.3f} ms > "
+                        f"{worst_p95(baseline) * 1000:.3f} ms")
+    if not result["consistent"]:
+        problems.append("stack inconsistente")
+    return problems
+
+def tracker_args_for(name, tracker_args):
+    """Agrega los plugins que necesita la traza si no se eligieron a mano"""
+    if name in TRACE_PLUGINS and not any(arg.startswith("--plugins") for arg in tracker_args):
+        return [*tracker_args, "--plugins", TRACE_PLUGINS[name]]
+    return tracker_args
+
+def parse_args():
+    argv = sys.argv[1:]
+    tracker_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, tracker_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Benchmark de window-tracker.py con un i3 falso")
+    parser.add_argument("--trace", action="append",
+                        help=f"traza sintética ({', '.join(TRACES)}) o JSONL grabado; "
+                             "se puede repetir (por defecto todas las sintéticas)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="eventos por segundo a emitir (por defecto lo más rápido "
+                             "posible, salvo las trazas que fijan su ritmo)")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="segundos máximos para que el tracker se ponga al día")
+    parser.add_argument("--save", help="guardar los resultados en JSON")
+    parser.add_argument("--baseline", help="resultados JSON contra los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="empeoramiento admitido respecto de --baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    args.tracker_args = tracker_args
+    return args
+
+def main():
+    args = parse_args()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    failed = False
+    for name in args.trace or list(TRACES):
+        result = run(load_trace(name, args.seed), tracker_args_for(name, args.tracker_args),
+                     args.rate or TRACE_RATES.get(name, 0), args.timeout)
+        results[name] = result
+        print_report(name, result)
+        if result["errors"] or not result["consistent"]:
+            failed = True
+        if baseline and name in baseline:
+            for problem in regressions(result, baseline[name], args.tolerance):
+                print(f"  REGRESIÓN: {problem}")
+                failed = True
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Cliente mínimo del socket de window-tracker.py (solo stdlib, arranque rápido).
+
+Uso: tracker-client.py <consulta> [args...]
+Ej:  tracker-client.py kill-newest
+     tracker-client.py stack 3
+     tracker-client.py windows class=keybinds_hud
+
+Imprime la respuesta JSON. Sale con 0 si el daemon respondió ok, 1 si
+respondió con error y 2 si el daemon no está corriendo.
+"""
+
+import json
+import os
+import shlex
+import socket
+import sys
+
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"),
+                           "i3-window-tracker.sock")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__.strip(), file=sys.stderr)
+        return 1
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            sock.connect(SOCKET_PATH)
+            sock.sendall((shlex.join(sys.argv[1:]) + "\n").encode())
+            reply = sock.makefile("rb").readline()
+    except OSError:
+        return 2
+
+    if not reply:
+        return 2
+    print(reply.decode().strip())
+    return 0 if json.loads(reply).get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
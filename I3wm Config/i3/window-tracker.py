@@ -2,105 +2,1894 @@
 """
 Daemon que trackea el orden de creación de ventanas en i3.
 Guarda el orden en un archivo para que close-newest.sh pueda usarlo.
+
+El stack vive en memoria (fuente de verdad) y se persiste con
+write-behind: los cambios se agrupan y se escriben de forma atómica
+(archivo temporal + rename) como mucho FLUSH_DELAY_MS después del primero.
+Con --journal solo se agregan registros cortos a un journal y el JSON se
+reescribe al compactar. Con --async los eventos se procesan por lotes:
+los que llegan dentro de --batch-ms se juntan y los window::move repetidos
+de una misma ventana se fusionan.
+
+Métricas (eventos, latencias, cola, escrituras): consulta "status" del
+socket, --metrics-file para un archivo de texto Prometheus y --profile para
+volcar estadísticas de cProfile con SIGUSR1.
+
+Además aloja plugins (--plugins hotplug,autotiling,...) que comparten la
+conexión con i3, la suscripción a eventos y el estado en memoria, en vez de
+ser un proceso aparte cada uno. Los de ~/.config/i3/tracker-plugins/*.py se
+cargan solos.
 """
 
 import i3ipc
+import argparse
+import asyncio
+import atexit
+import bisect
+import collections
+import concurrent.futures
+import contextlib
 import json
+import math
 import os
+import re
+import runpy
+import shlex
+import signal
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 STACK_FILE = os.path.expanduser("~/.cache/i3-window-stack.json")
+JOURNAL_FILE = os.path.expanduser("~/.cache/i3-window-stack.journal")
+COMPACT_EVERY = 500  # Registros en el journal antes de compactar
+FLUSH_DELAY_MS = 200  # Antigüedad máxima de la copia en disco
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"),
+                           "i3-window-tracker.sock")
+METRICS_FILE = os.path.expanduser("~/.cache/i3-window-tracker.prom")
+PROFILE_FILE = os.path.expanduser("~/.cache/i3-window-tracker.pstats")
+LATENCY_SAMPLES = 1024  # Muestras por tipo de evento para los percentiles
+PLUGIN_DIR = os.path.expanduser("~/.config/i3/tracker-plugins")
+MONITOR_SWITCH = os.path.expanduser("~/.config/i3/monitor-switch.sh")
+TAPS_FILE = os.path.expanduser("~/.config/i3/taps.json")
+MRU_SIZE = 50  # Ventanas recordadas por historial de foco
+USAGE_FILE = os.path.expanduser("~/.cache/i3-usage.tsv")
+USAGE_ROFI_DIR = os.path.expanduser("~/.cache/i3-usage")  # rofi -cache-dir
+USAGE_SLOTS = 256  # Clases recordadas como máximo
+BATCH_WINDOW_MS = 2  # Espera máxima para juntar eventos en un lote (--async)
+HOTPLUG_DEBOUNCE_MS = 50  # Una conexión de HDMI genera varios eventos seguidos
+
+# Estado en memoria (ver WindowStack)
+state_lock = threading.Lock()
+
+_flush_lock = threading.Lock()  # Una sola escritura a disco a la vez
+_flush_timer = None
+_flush_delay = FLUSH_DELAY_MS / 1000
+_batch_window = BATCH_WINDOW_MS / 1000
+_on_dirty = None  # En modo asyncio: avisa a la tarea de persistencia
+_profiler = None  # cProfile.Profile con --profile
+
+
+def workspace_number(ws_name):
+    """Número del workspace según la regla de i3 (dígitos iniciales, si no -1)"""
+    match = re.match(r"\d+", ws_name)
+    return int(match.group()) if match else -1
+
+
+class OccupiedIndex:
+    """Números de workspace con al menos una ventana, ordenados.
+
+    Se actualiza solo cuando un workspace pasa de vacío a ocupado (o al
+    revés); next/prev se resuelven con bisect, sin pedir el árbol a i3.
+    """
+
+    def __init__(self):
+        self.counts = {}    # {num: ventanas}
+        self.numbers = []   # Ordenado
+
+    def add(self, num, n=1):
+        if num < 0 or n <= 0:  # Un workspace vacío no cuenta como ocupado
+            return
+        before = self.counts.get(num, 0)
+        self.counts[num] = before + n
+        if before == 0:
+            bisect.insort(self.numbers, num)
+
+    def remove(self, num, n=1):
+        if num < 0 or n <= 0 or num not in self.counts:
+            return
+        self.counts[num] -= n
+        if self.counts[num] <= 0:
+            del self.counts[num]
+            del self.numbers[bisect.bisect_left(self.numbers, num)]
+
+    def cycle(self, current, step):
+        """Siguiente (step > 0) o anterior workspace ocupado, con vuelta circular"""
+        numbers = self.numbers
+        if not numbers or numbers == [current]:
+            return None
+        if step > 0:
+            return numbers[bisect.bisect_right(numbers, current) % len(numbers)]
+        return numbers[bisect.bisect_left(numbers, current) - 1]
+
+    def clear(self):
+        self.counts.clear()
+        self.numbers.clear()
+
+
+class WindowStack:
+    """Orden de creación de ventanas por workspace.
+
+    Cada workspace guarda un dict ordenado {con_id: None} (el orden de
+    inserción es el orden de creación) y un índice con_id -> workspace
+    permite agregar, quitar, mover y consultar la más reciente en O(1).
+    """
+
+    def __init__(self):
+        self.workspaces = {}  # {ws_name: {con_id: None}}
+        self.index = {}       # {con_id: ws_name}
+        self.occupied = OccupiedIndex()
+        self.journal = None   # Journal que recibe cada cambio (modo --journal)
+
+    def __contains__(self, con_id):
+        return con_id in self.index
+
+    def _log(self, op, con_id, value):
+        if self.journal is not None:
+            self.journal.record(op, con_id, value)
+
+    def _add(self, ws_name, con_id):
+        self.workspaces.setdefault(ws_name, {})[con_id] = None
+        self.index[con_id] = ws_name
+        self.occupied.add(workspace_number(ws_name))
+
+    def _remove(self, con_id):
+        ws_name = self.index.pop(con_id)
+        del self.workspaces[ws_name][con_id]
+        self.occupied.remove(workspace_number(ws_name))
+        return ws_name
+
+    def add(self, ws_name, con_id):
+        """Agrega la ventana al final (más reciente) de su workspace"""
+        if con_id in self.index:
+            return False
+        self._add(ws_name, con_id)
+        self._log("N", con_id, ws_name)
+        return True
+
+    def remove(self, con_id):
+        """Quita la ventana; retorna el workspace donde estaba (o None)"""
+        if con_id not in self.index:
+            return None
+        self._log("C", con_id, None)
+        return self._remove(con_id)
+
+    def move(self, con_id, ws_name):
+        """Mueve la ventana a otro workspace (queda como la más reciente allí)"""
+        if self.index.get(con_id) == ws_name:
+            return False
+        if con_id in self.index:
+            self._remove(con_id)
+        self._add(ws_name, con_id)
+        self._log("M", con_id, ws_name)
+        return True
+
+    def newest(self, ws_name):
+        windows = self.workspaces.get(ws_name)
+        if windows:
+            return next(reversed(windows))
+        return None
+
+    def windows(self, ws_name):
+        return list(self.workspaces.get(ws_name, ()))
+
+    def workspace_of(self, con_id):
+        return self.index.get(con_id)
+
+    def rename_workspace(self, old_name, new_name):
+        """Conserva el orden de las ventanas al renombrar un workspace"""
+        if old_name == new_name or old_name not in self.workspaces:
+            return False
+        windows = self.workspaces.pop(old_name)
+        self.workspaces[new_name] = windows
+        for con_id in windows:
+            self.index[con_id] = new_name
+        self.occupied.remove(workspace_number(old_name), len(windows))
+        self.occupied.add(workspace_number(new_name), len(windows))
+        self._log("R", 0, [old_name, new_name])
+        return True
+
+    def drop_workspace(self, ws_name):
+        """Olvida un workspace vacío que i3 destruyó"""
+        if ws_name in self.workspaces and not self.workspaces[ws_name]:
+            del self.workspaces[ws_name]
+            self._log("D", 0, ws_name)
+            return True
+        return False
+
+    def apply_record(self, op, con_id, value):
+        """Re-aplica un registro del journal (idempotente, para la recuperación)"""
+        if op == "N":
+            self.add(value, con_id)
+        elif op == "C":
+            self.remove(con_id)
+        elif op == "M":
+            self.move(con_id, value)
+        elif op == "R":
+            self.rename_workspace(*value)
+        elif op == "D":
+            self.drop_workspace(value)
+
+    def translate_ids(self, mapping):
+        """Cambia los con_id conservando el orden (tras un restart de i3).
+
+        Los que no tienen equivalente en mapping se descartan. No se registra
+        en el journal: después de esto siempre se compacta.
+        """
+        workspaces = {ws_name: [mapping[c] for c in ids if c in mapping]
+                      for ws_name, ids in self.workspaces.items()}
+        self.clear()
+        for ws_name, ids in workspaces.items():
+            self.workspaces[ws_name] = {}
+            for con_id in ids:
+                self._add(ws_name, con_id)
+
+    def load_json(self, data):
+        """Carga un snapshot {workspace: [con_id, ...]} respetando su orden"""
+        for ws_name, ids in data.items():
+            self.workspaces.setdefault(ws_name, {})
+            for con_id in ids:
+                self.add(ws_name, con_id)
+
+    def clear(self):
+        self.workspaces.clear()
+        self.index.clear()
+        self.occupied.clear()
+
+    def to_json(self):
+        """Mismo formato que lee close-newest.sh: {workspace: [con_id, ...]}"""
+        return {ws: list(ids) for ws, ids in self.workspaces.items()}
+
+
+class WindowInfo:
+    """Datos de una ventana en el espejo del árbol (compacto: __slots__)"""
+
+    __slots__ = ("id", "window", "cls", "instance", "title", "workspace",
+                 "floating", "urgent", "created")
+
+    def __init__(self, con_id, created=None):
+        self.id = con_id
+        self.window = None
+        self.cls = None
+        self.instance = None
+        self.title = None
+        self.workspace = None
+        self.floating = False
+        self.urgent = False
+        self.created = created
+
+    def update(self, con):
+        """Copia las propiedades que trae un container de i3"""
+        self.window = con.window
+        self.cls = con.window_class
+        self.instance = con.window_instance
+        self.title = con.name
+        self.floating = bool(con.floating and con.floating.endswith("_on"))
+        self.urgent = bool(con.urgent)
+
+
+def as_text(value):
+    """Valor de un campo tal como se escribe en un filtro (true/false, "" para None)"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "" if value is None else str(value)
+
+
+class TreeMirror:
+    """Espejo incremental de las ventanas de i3 y de qué output tiene cada workspace.
+
+    Se mantiene con eventos window::*, workspace::* y output, así las
+    consultas ("ventanas con class=X", "ventanas en el output Y") no
+    necesitan get_tree ni xdotool search.
+    """
+
+    # Campo de la consulta -> atributo de WindowInfo
+    FIELDS = {"id": "id", "window": "window", "class": "cls",
+              "instance": "instance", "title": "title", "workspace": "workspace",
+              "floating": "floating", "urgent": "urgent", "created": "created"}
+
+    def __init__(self):
+        self.windows = {}    # {con_id: WindowInfo}
+        self.ws_output = {}  # {ws_name: output}
+
+    def add(self, con, ws_name, created=None):
+        info = self.windows.get(con.id)
+        if info is None:
+            info = self.windows[con.id] = WindowInfo(con.id, created)
+        info.update(con)
+        info.workspace = ws_name
+        return info
+
+    def update(self, con):
+        info = self.windows.get(con.id)
+        if info is not None:
+            info.update(con)
+        return info
+
+    def set_workspace(self, con_id, ws_name):
+        info = self.windows.get(con_id)
+        if info is not None:
+            info.workspace = ws_name
+
+    def remove(self, con_id):
+        return self.windows.pop(con_id, None)
+
+    def rename_workspace(self, old_name, new_name):
+        if old_name in self.ws_output:
+            self.ws_output[new_name] = self.ws_output.pop(old_name)
+        for info in self.windows.values():
+            if info.workspace == old_name:
+                info.workspace = new_name
+
+    def as_dict(self, info):
+        data = {field: getattr(info, attr) for field, attr in self.FIELDS.items()}
+        data["output"] = self.ws_output.get(info.workspace)
+        return data
+
+    def find(self, filters):
+        """Ventanas que cumplen todos los filtros [(campo, op, valor)].
+
+        op "=" compara igual (como texto) y "~" busca una subcadena, como
+        xdotool search --name.
+        """
+        result = []
+        for info in self.windows.values():
+            data = self.as_dict(info)
+            for field, op, value in filters:
+                current = as_text(data.get(field))
+                if op == "=" and current != value:
+                    break
+                if op == "~" and value not in current:
+                    break
+            else:
+                result.append(data)
+        return result
+
+    def clear(self):
+        self.windows.clear()
+        self.ws_output.clear()
+
+
+stack = WindowStack()
+mirror = TreeMirror()
+focused_workspace = None  # Actualizado con workspace::focus
+workspace_names = {}      # {id del container del workspace: nombre}, para renames
+
+
+class Journal:
+    """Journal append-only del stack.
+
+    Cada cambio es una línea "<op> <con_id> <valor JSON>": N (nueva),
+    C (cerrada), M (movida), R (workspace renombrado) y D (workspace
+    destruido). Los registros se acumulan en memoria y se agregan al
+    archivo en la misma escritura diferida que usa el resto del daemon.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self.on_disk = 0  # Registros escritos desde la última compactación
+
+    def record(self, op, con_id, value):
+        self.pending.append(f"{op} {con_id} {json.dumps(value)}\n")
+
+    def take_pending(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+    def append(self, lines):
+        """Agrega los registros al archivo; devuelve los bytes escritos"""
+        if not lines:
+            return 0
+        data = "".join(lines).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self.on_disk += len(lines)
+        return len(data)
+
+    def replay(self, target):
+        """Re-aplica los registros sobre un WindowStack.
+
+        Una última línea cortada (el daemon murió a mitad de escritura) se
+        ignora: los registros anteriores siguen siendo válidos.
+        """
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+        count = 0
+        for line in lines:
+            try:
+                op, con_id, value = line.rstrip("\n").split(" ", 2)
+                target.apply_record(op, int(con_id), json.loads(value))
+            except (ValueError, TypeError):
+                print(f"window-tracker: registro inválido en el journal: {line!r}",
+                      file=sys.stderr)
+                continue
+            count += 1
+        self.on_disk = count
+        return count
+
+    def truncate(self):
+        with open(self.path, "w"):
+            pass
+        self.on_disk = 0
+
+
+# ==================== MÉTRICAS ====================
+
+class Latency:
+    """Duraciones (en segundos) de algo que se repite.
+
+    count y total cubren todo el historial; los percentiles salen de las
+    últimas LATENCY_SAMPLES muestras, así reflejan el comportamiento reciente
+    sin crecer con el tiempo.
+    """
+
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self):
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """{q: valor} por rango más cercano ({} si todavía no hay muestras)"""
+        data = sorted(self.samples)
+        if not data:
+            return {}
+        return {q: data[max(math.ceil(q * len(data)) - 1, 0)] for q in qs}
+
+    def as_dict(self):
+        result = {"count": self.count, "sum": round(self.total, 6)}
+        for q, value in self.quantiles().items():
+            result[f"p{int(q * 100)}"] = round(value, 6)
+        return result
+
+
+class Metrics:
+    """Contadores del daemon, compartidos entre el hilo de eventos, el de
+    persistencia y los del socket.
+
+    La latencia de un evento es el tiempo desde que se recibió hasta que su
+    efecto quedó aplicado; en modo --async incluye la espera en la cola.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.events = {}     # {nombre del evento: recibidos}
+        self.latency = {}    # {nombre del evento: Latency}
+        self.coalesced = 0   # window::move descartados por coalesce_events
+        self.flush = Latency()
+        self.flush_bytes = 0
+        self.queue_depth = 0      # Eventos en el último lote (--async)
+        self.queue_depth_max = 0
+
+    def observe_event(self, name, seconds):
+        with self.lock:
+            self.events[name] = self.events.get(name, 0) + 1
+            latency = self.latency.get(name)
+            if latency is None:
+                latency = self.latency[name] = Latency()
+            latency.observe(seconds)
+
+    def observe_batch(self, depth, coalesced):
+        with self.lock:
+            self.queue_depth = depth
+            self.queue_depth_max = max(self.queue_depth_max, depth)
+            self.coalesced += coalesced
+
+    def observe_flush(self, seconds, nbytes):
+        with self.lock:
+            self.flush.observe(seconds)
+            self.flush_bytes += nbytes
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "uptime": round(time.time() - self.started, 1),
+                "events": dict(self.events),
+                "latency": {name: lat.as_dict() for name, lat in self.latency.items()},
+                "coalesced": self.coalesced,
+                "queue_depth": self.queue_depth,
+                "queue_depth_max": self.queue_depth_max,
+                "flush": self.flush.as_dict(),
+                "bytes_written": self.flush_bytes,
+            }
+
+    def prometheus(self):
+        """Formato de texto de Prometheus (para el textfile collector de node_exporter)"""
+        status = self.as_dict()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}" if label_text
+                             else f"{name}{suffix} {value}")
+
+        def summary(name, help_text, by_label):
+            samples = []
+            for labels, lat in by_label:
+                for key in ("p50", "p95", "p99"):
+                    if key in lat:
+                        quantile = {"p50": "0.5", "p95": "0.95", "p99": "0.99"}[key]
+                        samples.append(("", dict(labels, quantile=quantile), lat[key]))
+                samples.append(("_sum", labels, lat["sum"]))
+                samples.append(("_count", labels, lat["count"]))
+            metric(name, "summary", help_text, samples)
+
+        metric("i3_tracker_uptime_seconds", "gauge", "Segundos desde que arrancó el daemon",
+               [("", {}, status["uptime"])])
+        metric("i3_tracker_events_total", "counter", "Eventos de i3 procesados",
+               [("", {"event": name}, count) for name, count in sorted(status["events"].items())])
+        summary("i3_tracker_event_latency_seconds", "Desde que llega el evento hasta aplicarlo",
+                [({"event": name}, lat) for name, lat in sorted(status["latency"].items())])
+        metric("i3_tracker_events_coalesced_total", "counter", "window::move fusionados en un lote",
+               [("", {}, status["coalesced"])])
+        metric("i3_tracker_queue_depth", "gauge", "Eventos en el último lote (--async)",
+               [("", {}, status["queue_depth"])])
+        metric("i3_tracker_queue_depth_max", "gauge", "Lote más grande visto (--async)",
+               [("", {}, status["queue_depth_max"])])
+        summary("i3_tracker_flush_seconds", "Duración de cada escritura del stack",
+                [({}, status["flush"])])
+        metric("i3_tracker_written_bytes_total", "counter", "Bytes escritos en el stack y el journal",
+               [("", {}, status["bytes_written"])])
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+def atomic_write(path, data):
+    """Escribe un archivo de forma atómica (archivo temporal + rename): los
+    lectores nunca ven uno a medias. Devuelve los bytes escritos."""
+    if isinstance(data, str):
+        data = data.encode()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+    return len(data)
+
+def write_metrics(path=METRICS_FILE):
+    atomic_write(path, metrics.prometheus())
+
+def metrics_writer(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics(path)
+        except OSError as ex:
+            print(f"window-tracker: no se pudo escribir {path}: {ex}", file=sys.stderr)
+
+def dump_profile(*args):
+    """SIGUSR1 con --profile: vuelca lo acumulado a PROFILE_FILE (ver con python -m pstats)"""
+    _profiler.disable()
+    try:
+        _profiler.dump_stats(PROFILE_FILE)
+    finally:
+        _profiler.enable()
+    print(f"window-tracker: perfil guardado en {PROFILE_FILE}", file=sys.stderr)
+
 
 def load_stack():
+    """Lee el snapshot JSON; si está dañado se avisa en vez de ocultarlo"""
     try:
         with open(STACK_FILE, 'r') as f:
             return json.load(f)
-    except:
+    except FileNotFoundError:
+        return {}
+    except ValueError as ex:
+        print(f"window-tracker: {STACK_FILE} dañado ({ex}), se ignora", file=sys.stderr)
         return {}
 
-def save_stack(stack):
-    os.makedirs(os.path.dirname(STACK_FILE), exist_ok=True)
-    with open(STACK_FILE, 'w') as f:
-        json.dump(stack, f)
+def save_stack(data):
+    """Escribe el snapshot JSON; devuelve los bytes escritos"""
+    return atomic_write(STACK_FILE, json.dumps(data))
 
-def on_window_new(i3, e):
-    """Cuando se crea una ventana, agregarla al stack de su workspace"""
-    stack = load_stack()
+def recover_stack(journal=None):
+    """Snapshot (+ cola del journal): el orden que el daemon había aprendido"""
+    with state_lock:
+        stack.clear()
+        stack.load_json(load_stack())
+        return journal.replay(stack) if journal else 0
 
-    con = e.container
-    ws = con.workspace()
-    if ws:
-        ws_name = ws.name
-        if ws_name not in stack:
-            stack[ws_name] = []
+def flush_stack(compact=False):
+    """Vuelca el estado en memoria a disco (llamado por el timer o al salir).
 
-        # Agregar al final (más reciente)
-        con_id = con.id
-        if con_id and con_id not in stack[ws_name]:
-            stack[ws_name].append(con_id)
+    Sin journal reescribe el JSON completo. Con journal solo agrega los
+    registros pendientes y compacta (snapshot JSON + journal vacío) cada
+    COMPACT_EVERY registros o cuando se pide.
+    """
+    global _flush_timer
+    with _flush_lock:
+        start = time.perf_counter()
+        with state_lock:
+            _flush_timer = None
+            journal = stack.journal
+            pending = journal.take_pending() if journal else []
+            if journal:
+                compact = compact or journal.on_disk + len(pending) >= COMPACT_EVERY
+            snapshot = stack.to_json() if journal is None or compact else None
 
-        save_stack(stack)
+        if journal and not compact:
+            written = journal.append(pending)
+        else:
+            written = save_stack(snapshot)
+            if journal:
+                journal.truncate()
+        metrics.observe_flush(time.perf_counter() - start, written)
 
-def on_window_close(i3, e):
+def schedule_flush():
+    """Marca el stack como sucio; varios cambios seguidos generan una sola escritura"""
+    global _flush_timer
+    if _on_dirty is not None:
+        _on_dirty()
+    elif _flush_timer is None:
+        _flush_timer = threading.Timer(_flush_delay, flush_stack)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+def workspace_in_tree(tree, con_id):
+    """Nombre del workspace de un container.
+
+    Los containers que llegan en los eventos no traen padre, así que
+    con.workspace() no sirve: hay que ubicarlo en el árbol actual.
+    """
+    found = tree.find_by_id(con_id) if tree else None
+    ws = found.workspace() if found else None
+    return ws.name if ws else None
+
+def is_scratchpad(ws_name):
+    return ws_name.startswith("__")
+
+# ==================== EVENTOS ====================
+#
+# Cada apply_* actualiza el estado para un evento y retorna True si el stack
+# cambió. Se llaman con state_lock tomado y lo que requiere I/O (árbol,
+# workspaces) les llega ya resuelto, así el modo normal (evento a evento) y
+# el modo asyncio (por lotes) comparten la misma lógica.
+
+APPLIERS = {}
+NEEDS_TREE = {"window::new", "window::move"}
+NEEDS_WORKSPACES = {"output"}
+
+def applies(*names):
+    """Registra una función como aplicador de los eventos dados"""
+    def register(func):
+        for name in names:
+            APPLIERS[name] = func
+        return func
+    return register
+
+def event_name(base, e):
+    """Nombre completo del evento: window + new -> window::new (output y binding van solos)"""
+    if base in ("window", "workspace"):
+        return f"{base}::{e.change}"
+    return base
+
+@applies("window::new")
+def apply_window_new(e, tree, workspaces):
+    """Cuando se crea una ventana, agregarla al stack de su workspace"""
+    con = e.container
+    ws_name = workspace_in_tree(tree, con.id)
+    mirror.add(con, ws_name, created=time.time())
+    if ws_name and not is_scratchpad(ws_name) and con.id:
+        # Agregar al final (más reciente)
+        return stack.add(ws_name, con.id)
+    return False
+
+@applies("window::close")
+def apply_window_close(e, tree, workspaces):
     """Cuando se cierra una ventana, quitarla del stack"""
-    stack = load_stack()
+    mirror.remove(e.container.id)
+    return stack.remove(e.container.id) is not None
 
+@applies("window::move")
+def apply_window_move(e, tree, workspaces):
+    """Cuando se mueve una ventana a otro workspace, actualizar stacks"""
     con = e.container
-    con_id = con.id
+    ws_name = workspace_in_tree(tree, con.id)
+    mirror.update(con)
+    mirror.set_workspace(con.id, ws_name)
+    if ws_name and not is_scratchpad(ws_name):
+        return stack.move(con.id, ws_name)
+    # Fuera de cualquier workspace visible (scratchpad)
+    return stack.remove(con.id) is not None
 
-    # Buscar y eliminar de cualquier workspace
-    for ws_name in stack:
-        if con_id in stack[ws_name]:
-            stack[ws_name].remove(con_id)
-            break
+@applies("window::title", "window::urgent", "window::floating",
+         "window::fullscreen_mode", "window::mark")
+def apply_window_change(e, tree, workspaces):
+    """title, urgent, floating, etc.: solo refrescan el espejo"""
+    mirror.update(e.container)
+    return False
 
-    save_stack(stack)
+@applies("workspace::focus")
+def apply_workspace_focus(e, tree, workspaces):
+    """Recordar el workspace enfocado para responder consultas sin preguntar a i3"""
+    global focused_workspace
+    if e.current:
+        focused_workspace = e.current.name
+        workspace_names[e.current.id] = e.current.name
+    return False
 
-def on_window_move(i3, e):
-    """Cuando se mueve una ventana a otro workspace, actualizar stacks"""
-    stack = load_stack()
+@applies("workspace::init")
+def apply_workspace_init(e, tree, workspaces):
+    if e.current:
+        workspace_names[e.current.id] = e.current.name
+        mirror.ws_output[e.current.name] = e.current.ipc_data.get("output")
+    return False
 
-    con = e.container
-    con_id = con.id
-
-    # Eliminar de todos los workspaces
-    for ws_name in stack:
-        if con_id in stack[ws_name]:
-            stack[ws_name].remove(con_id)
-
-    # Agregar al workspace actual
-    ws = con.workspace()
-    if ws:
-        ws_name = ws.name
-        if ws_name not in stack:
-            stack[ws_name] = []
-        stack[ws_name].append(con_id)
-
-    save_stack(stack)
-
-def init_stack(i3):
-    """Inicializar el stack con las ventanas existentes"""
-    stack = {}
+@applies("workspace::move")
+def apply_workspace_move(e, tree, workspaces):
+    """Un workspace cambió de output"""
+    if e.current:
+        mirror.ws_output[e.current.name] = e.current.ipc_data.get("output")
+    return False
+
+@applies("workspace::rename")
+def apply_workspace_rename(e, tree, workspaces):
+    """El evento solo trae el nombre nuevo: el viejo se busca por id"""
+    global focused_workspace
+    ws = e.current
+    old_name = workspace_names.get(ws.id) if ws else None
+    if not old_name:
+        return False
+    workspace_names[ws.id] = ws.name
+    if focused_workspace == old_name:
+        focused_workspace = ws.name
+    mirror.rename_workspace(old_name, ws.name)
+    return stack.rename_workspace(old_name, ws.name)
+
+@applies("workspace::empty")
+def apply_workspace_empty(e, tree, workspaces):
+    if not e.current:
+        return False
+    workspace_names.pop(e.current.id, None)
+    mirror.ws_output.pop(e.current.name, None)
+    return stack.drop_workspace(e.current.name)
+
+@applies("output")
+def apply_output(e, tree, workspaces):
+    """Conexión/desconexión de monitores: re-mapear workspaces a outputs"""
+    mirror.ws_output = {ws.name: ws.output for ws in workspaces}
+    return False
+
+def apply_events(events, tree=None, workspaces=None):
+    """Aplica una lista de (nombre, evento) en un solo paso y agenda la persistencia"""
+    changed = False
+    with state_lock:
+        for name, e in events:
+            func = APPLIERS.get(name)
+            if func and func(e, tree, workspaces):
+                changed = True
+        if changed:
+            schedule_flush()
+    return changed
+
+def on_event(i3, e, base):
+    """Modo normal: cada evento se aplica apenas llega"""
+    start = time.perf_counter()
+    name = event_name(base, e)
+    try:
+        handle_event(i3, e, name)
+    finally:
+        metrics.observe_event(name, time.perf_counter() - start)
+
+def handle_event(i3, e, name):
+    if name == "binding":
+        on_binding(i3, e)
+    elif name == "shutdown":
+        on_shutdown(i3, e, i3.main_quit)
+    if name in APPLIERS:
+        tree = i3.get_tree() if name in NEEDS_TREE else None
+        workspaces = i3.get_workspaces() if name in NEEDS_WORKSPACES else None
+        apply_events([(name, e)], tree, workspaces)
+    dispatch(i3, e, name)
+
+def reconcile_stack(live):
+    """Ajusta el stack al árbol vivo {con_id: workspace} (con state_lock tomado).
+
+    Las ventanas que ya no existen se quitan, las que cambiaron de
+    workspace se mueven y las desconocidas se agregan al final; el resto
+    conserva el orden aprendido. Con el stack vacío equivale a reconstruirlo.
+    """
+    for con_id in [c for c in stack.index if c not in live]:
+        stack.remove(con_id)
+    for con_id, ws_name in live.items():
+        if con_id in stack:
+            stack.move(con_id, ws_name)
+        else:
+            stack.add(ws_name, con_id)
+
+def init_stack(i3, restarted=False):
+    """Sincroniza el stack con las ventanas existentes conservando el orden aprendido.
+
+    Con restarted=True (después de un restart de i3) los con_id viejos se
+    traducen a los nuevos a través del X window id, que sí sobrevive.
+    """
+    global focused_workspace
     tree = i3.get_tree()
+    workspaces = i3.get_workspaces()
+    focused = [ws.name for ws in workspaces if ws.focused]
+    scratchpad = tree.scratchpad()
+
+    with state_lock:
+        if restarted:
+            by_window = {info.window: info.id for info in mirror.windows.values() if info.window}
+            stack.translate_ids({by_window[con.window]: con.id for con in tree.descendants()
+                                 if con.window in by_window})
+
+        focused_workspace = focused[0] if focused else None
+        mirror.clear()
+        mirror.ws_output = {ws.name: ws.output for ws in workspaces}
+        workspace_names.clear()
+        live = {}
+        for ws in tree.workspaces():
+            workspace_names[ws.id] = ws.name
+            stack.workspaces.setdefault(ws.name, {})
+            for con in ws.descendants():
+                if con.window:  # Solo containers con ventana real
+                    live[con.id] = ws.name
+                    mirror.add(con, ws.name)
+
+        # El espejo también conoce las ventanas del scratchpad
+        for con in (scratchpad.descendants() if scratchpad else []):
+            if con.window:
+                mirror.add(con, scratchpad.name)
+
+        reconcile_stack(live)
+
+    flush_stack(compact=True)
+
+def resync_after_restart(i3, attempts=50):
+    """Espera a que i3 vuelva y re-sincroniza (la conexión se reconecta sola)"""
+    for _ in range(attempts):
+        try:
+            init_stack(i3, restarted=True)
+            return
+        except Exception:
+            # El i3 viejo cerró la conexión o el nuevo todavía no escucha
+            time.sleep(0.1)
+    print("window-tracker: i3 no volvió después del restart", file=sys.stderr)
+
+def on_shutdown(i3, e, quit):
+    """restart: re-sincronizar en segundo plano sin frenar los eventos; exit: salir"""
+    if e.change == "restart":
+        threading.Thread(target=resync_after_restart, args=(i3,), daemon=True).start()
+    else:
+        quit()
+
+# ==================== SERVIDOR DE CONSULTAS ====================
+#
+# Protocolo: una línea "<consulta> [args...]" por petición (con comillas
+# estilo shell para argumentos con espacios) y una línea JSON de respuesta,
+# siempre con "ok". Se puede probar con: nc -U <socket>
+
+QUERIES = {}
 
-    for ws in tree.workspaces():
-        ws_name = ws.name
-        stack[ws_name] = []
-        for con in ws.descendants():
-            if con.window:  # Solo containers con ventana real
-                stack[ws_name].append(con.id)
+def query(name):
+    """Registra una función como consulta del socket"""
+    def register(func):
+        QUERIES[name] = func
+        return func
+    return register
 
-    save_stack(stack)
+def target_workspace(args):
+    return args[0] if args else focused_workspace
+
+@query("focused")
+def query_focused(i3, args):
+    with state_lock:
+        return {"workspace": focused_workspace}
+
+@query("newest")
+def query_newest(i3, args):
+    """Ventana más reciente del workspace dado (o del enfocado)"""
+    with state_lock:
+        ws_name = target_workspace(args)
+        return {"workspace": ws_name, "con_id": stack.newest(ws_name)}
+
+@query("stack")
+def query_stack(i3, args):
+    """Stack completo de un workspace (o todos con "stack *")"""
+    with state_lock:
+        if args == ["*"]:
+            return {"stack": stack.to_json()}
+        ws_name = target_workspace(args)
+        return {"workspace": ws_name, "windows": stack.windows(ws_name)}
+
+@query("occupied")
+def query_occupied(i3, args):
+    """Números de los workspaces con ventanas, ordenados"""
+    with state_lock:
+        return {"workspaces": list(stack.occupied.numbers)}
+
+@query("windows")
+def query_windows(i3, args):
+    """Ventanas del espejo filtradas: windows class=keybinds_hud output=HDMI-1 title~HUD"""
+    filters = []
+    for arg in args:
+        match = re.match(r"([a-z]+)([=~])(.*)", arg)
+        if not match:
+            raise ValueError(f"filtro inválido: {arg}")
+        field, op, value = match.groups()
+        if field not in TreeMirror.FIELDS and field != "output":
+            raise ValueError(f"campo desconocido: {field}")
+        filters.append((field, op, value))
+    with state_lock:
+        return {"windows": mirror.find(filters)}
+
+@query("kill-newest")
+def query_kill_newest(i3, args):
+    """Cierra la ventana más reciente del workspace (lo que hacía close-newest.sh)"""
+    with state_lock:
+        ws_name = target_workspace(args)
+        con_id = stack.newest(ws_name)
+    if con_id is None:
+        return {"workspace": ws_name, "con_id": None}
+    reply = i3.command(f"[con_id={con_id}] kill")
+    return {"workspace": ws_name, "con_id": con_id,
+            "killed": bool(reply and reply[0].success)}
+
+@query("status")
+def query_status(i3, args):
+    """Métricas del daemon (ver Metrics) y tamaño del estado"""
+    result = metrics.as_dict()
+    with state_lock:
+        result["windows"] = len(stack.index)
+        result["journal_records"] = stack.journal.on_disk if stack.journal else None
+    return result
+
+@query("ws-cycle")
+def query_ws_cycle(i3, args):
+    """Igual que el binding: nop tracker ws-cycle next|prev"""
+    return {"workspace": action_ws_cycle(i3, args)}
+
+def handle_query(i3, line):
+    try:
+        parts = shlex.split(line)
+    except ValueError as ex:
+        return {"ok": False, "error": str(ex)}
+    if not parts:
+        return {"ok": False, "error": "consulta vacía"}
+    func = QUERIES.get(parts[0])
+    if func is None:
+        return {"ok": False, "error": f"consulta desconocida: {parts[0]}"}
+    try:
+        result = func(i3, parts[1:])
+    except Exception as ex:
+        return {"ok": False, "error": str(ex)}
+    result["ok"] = True
+    return result
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            reply = handle_query(self.server.i3, raw.decode("utf-8", "replace"))
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+@contextlib.contextmanager
+def private_socket(path):
+    """Crea el socket solo accesible por el usuario y lo borra al salir"""
+    try:
+        os.unlink(path)  # Socket viejo de una ejecución anterior
+    except FileNotFoundError:
+        pass
+    old_umask = os.umask(0o077)
+    try:
+        yield
+    finally:
+        os.umask(old_umask)
+    atexit.register(lambda: os.path.exists(path) and os.unlink(path))
+
+def start_query_server(i3, path=SOCKET_PATH):
+    """Escucha consultas en un hilo aparte; responde desde el estado en memoria"""
+    with private_socket(path):
+        server = QueryServer(path, QueryHandler)
+    server.i3 = i3
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+# ==================== ACCIONES DE TECLADO ====================
+#
+# Bindings del estilo "bindsym $mod+Shift+q nop tracker close-newest" no
+# lanzan ningún proceso: i3 emite un evento binding y el daemon ejecuta la
+# acción con su conexión ya abierta.
+
+BINDING_PREFIX = ["nop", "tracker"]
+ACTIONS = {}
+
+def action(name):
+    """Registra una función como acción de: nop tracker <name> [args]"""
+    def register(func):
+        ACTIONS[name] = func
+        return func
+    return register
+
+@action("close-newest")
+def action_close_newest(i3, args):
+    query_kill_newest(i3, args)
+
+@action("ws-cycle")
+def action_ws_cycle(i3, args):
+    """Recorre los workspaces con ventanas (lo que hacía ws-cycle-occupied.sh)"""
+    step = -1 if args and args[0] == "prev" else 1
+    with state_lock:
+        current = workspace_number(focused_workspace or "")
+        target = stack.occupied.cycle(current, step)
+    if target is not None:
+        i3.command(f"workspace number {target}")
+    return target
+
+def on_binding(i3, e):
+    """Despacha los bindings "nop tracker ..." a su acción registrada"""
+    parts = e.binding.command.split()
+    if parts[:len(BINDING_PREFIX)] != BINDING_PREFIX or len(parts) <= len(BINDING_PREFIX):
+        return
+    name, args = parts[len(BINDING_PREFIX)], parts[len(BINDING_PREFIX) + 1:]
+    func = ACTIONS.get(name)
+    if func is None:
+        print(f"window-tracker: acción desconocida: {name}", file=sys.stderr)
+        return
+    func(i3, args)
+
+# ==================== PLUGINS ====================
+#
+# Un plugin es una clase registrada con @plugin que declara los eventos que
+# le interesan; el daemon se suscribe una sola vez a la unión de lo que piden
+# el stack y los plugins activos y le pasa a cada uno solo lo suyo. También
+# pueden registrar acciones (@action) y consultas (@query).
+#
+# Los archivos de PLUGIN_DIR se ejecutan con los globales de este módulo, así
+# que ahí se escribe igual que acá:
+#
+#     @plugin("hola")
+#     class Hola(Plugin):
+#         events = {"window::focus": "on_focus"}
+#         def on_focus(self, i3, e):
+#             print("foco en", e.container.name)
+
+CORE_EVENTS = ("window", "workspace", "output", "binding", "shutdown")
+PLUGINS = {}   # {nombre: clase}
+HANDLERS = {}  # {nombre de evento: [métodos de plugins activos]}
+active_plugins = []
+
+def plugin(name):
+    """Registra una clase de plugin con el nombre que se usa en --plugins"""
+    def register(cls):
+        cls.name = name
+        PLUGINS[name] = cls
+        return cls
+    return register
+
+class Plugin:
+    """Base de los plugins.
+
+    events mapea nombres de evento ("output", "window::focus" o solo
+    "window" para todos los de ventanas) a nombres de métodos, que reciben
+    (i3, e) con la conexión síncrona. Corren en el hilo de eventos (en modo
+    --async, en el de acciones, después de aplicar el lote), de a uno y en
+    orden: no deberían bloquear mucho.
+    """
+
+    name = None
+    events = {}
+
+    def __init__(self, i3, args):
+        self.i3 = i3
+        self.args = args
+
+    @classmethod
+    def add_arguments(cls, parser):
+        """Opciones propias del plugin (se agregan siempre, esté activo o no)"""
+
+    def start(self):
+        """Se llama una vez, con el stack ya inicializado y antes de recibir eventos"""
+
+def load_plugin_dir(path=PLUGIN_DIR):
+    """Ejecuta los plugins de usuario: un error en uno no tumba al daemon"""
+    if not os.path.isdir(path):
+        return
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith(".py"):
+            try:
+                runpy.run_path(os.path.join(path, filename), init_globals=globals())
+            except Exception as ex:
+                print(f"window-tracker: no se pudo cargar el plugin {filename}: {ex}",
+                      file=sys.stderr)
+
+def start_plugins(i3, args):
+    for name in args.plugins:
+        instance = PLUGINS[name](i3, args)
+        for event, method in instance.events.items():
+            HANDLERS.setdefault(event, []).append(getattr(instance, method))
+        active_plugins.append(instance)
+        instance.start()
+
+def event_bases():
+    """Tipos de evento a los que suscribirse (una sola suscripción para todos)"""
+    bases = list(CORE_EVENTS)
+    for event in HANDLERS:
+        base = event.split("::")[0]
+        if base not in bases:
+            bases.append(base)
+    return bases
+
+def wants_event(name):
+    return name in HANDLERS or name.split("::")[0] in HANDLERS
+
+def dispatch(i3, e, name):
+    """Entrega el evento a los plugins que lo pidieron"""
+    base = name.split("::")[0]
+    handlers = HANDLERS.get(name, []) + (HANDLERS.get(base, []) if base != name else [])
+    for handler in handlers:
+        try:
+            handler(i3, e)
+        except Exception as ex:
+            print(f"window-tracker: error en {handler.__qualname__}: {ex}", file=sys.stderr)
+
+# -------------------- hotplug --------------------
+#
+# i3 manda un evento "output" cada vez que RandR avisa un cambio de pantallas.
+# Se espera a que pase la ráfaga de eventos de una conexión y recién ahí se
+# compara el conjunto de salidas conectadas (un xrandr --query por ráfaga):
+# monitor-switch.sh solo corre si cambió. Así las propias llamadas a xrandr
+# del script (que también generan eventos) no lo vuelven a disparar.
+
+@plugin("hotplug")
+class Hotplug(Plugin):
+    """Corre monitor-switch.sh cuando cambian los monitores conectados
+    (reemplaza el polling de monitor-daemon.sh)"""
+
+    events = {"output": "notify"}
+
+    def __init__(self, i3, args):
+        super().__init__(i3, args)
+        self.delay = max(args.hotplug_ms, 0) / 1000
+        self.command = MONITOR_SWITCH
+        self.outputs = None  # Última topología vista (None: todavía ninguna)
+        self.timer = None
+        self.lock = threading.Lock()      # Protege timer
+        self.run_lock = threading.Lock()  # Un monitor-switch.sh a la vez
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--hotplug-ms", type=int, default=HOTPLUG_DEBOUNCE_MS,
+                            help="hotplug: espera (ms) a que termine la ráfaga de eventos output")
+
+    def start(self):
+        # Como monitor-daemon.sh: aplicar la configuración de pantallas al arrancar
+        threading.Thread(target=self.check, daemon=True).start()
+
+    def notify(self, i3, e):
+        """Evento output: reinicia la espera (debounce)"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.check)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def connected(self):
+        """Salidas con un monitor enchufado según RandR, como monitor-daemon.sh.
+
+        No sirve get_outputs() de i3: lista también los puertos desconectados,
+        y su "active" cambia con el propio --off/--auto de monitor-switch.sh.
+        """
+        try:
+            query = subprocess.run(["xrandr", "--query"], capture_output=True, text=True)
+        except OSError as ex:
+            print(f"window-tracker: no se pudo correr xrandr: {ex}", file=sys.stderr)
+            return None
+        return sorted(fields[0] for fields in map(str.split, query.stdout.splitlines())
+                      if len(fields) > 1 and fields[1] == "connected")
+
+    def check(self):
+        with self.run_lock:
+            outputs = self.connected()
+            if outputs is None or outputs == self.outputs:
+                return
+            self.outputs = outputs
+            try:
+                subprocess.run([self.command])
+            except OSError as ex:
+                print(f"window-tracker: no se pudo correr {self.command}: {ex}",
+                      file=sys.stderr)
+
+# -------------------- autotiling --------------------
+
+@plugin("autotiling")
+class Autotiling(Plugin):
+    """Alterna splith/splitv según la forma de la ventana enfocada (lo que
+    hacía el proceso autotiling, sin otra conexión ni otro intérprete)"""
+
+    events = {"window::focus": "on_focus"}
+
+    def on_focus(self, i3, e):
+        con = i3.get_tree().find_focused()
+        if con is None or con.type != "con" or con.parent is None:
+            return
+        if (con.floating or "").endswith("_on") or con.fullscreen_mode == 1:
+            return
+        if con.parent.layout in ("stacked", "tabbed"):
+            return
+        layout = "splitv" if con.rect.height > con.rect.width else "splith"
+        if con.parent.layout != layout:
+            i3.command(layout)
+
+# -------------------- historial de foco --------------------
+#
+# Orden de uso (MRU) por workspace y global, alimentado por window::focus.
+# Cada historial es un dict ordenado {con_id: None} con la más reciente al
+# final: enfocar es move_to_end y el tope se mantiene sacando la más vieja,
+# todo O(1). Las acciones resuelven con estos datos, sin pedir el árbol:
+#
+#     bindsym $mod+grave nop tracker focus-prev          (alt-tab del workspace)
+#     bindsym $mod+Shift+grave nop tracker focus-prev global
+#     nop tracker focus-nth 3 [global]  |  nop tracker close-mru [global]
+
+class FocusHistory:
+    """Historial MRU acotado: la más reciente al final"""
+
+    def __init__(self, size=MRU_SIZE):
+        self.size = size
+        self.order = collections.OrderedDict()
+
+    def touch(self, con_id):
+        """La lleva al final; retorna la que salió por el tope (o None)"""
+        self.order[con_id] = None
+        self.order.move_to_end(con_id)
+        if len(self.order) > self.size:
+            return self.order.popitem(last=False)[0]
+        return None
+
+    def discard(self, con_id):
+        self.order.pop(con_id, None)
+
+    def nth(self, n):
+        """n=0 la más reciente, n=1 la anterior, ..."""
+        if n >= len(self.order):
+            return None
+        for i, con_id in enumerate(reversed(self.order)):
+            if i == n:
+                return con_id
+
+    def recent(self):
+        return list(reversed(self.order))
+
+
+@plugin("focus-history")
+class FocusHistoryPlugin(Plugin):
+    """Historial de foco por workspace y global con acciones tipo alt-tab."""
+
+    events = {"window::focus": "on_focus", "window::close": "on_close",
+              "window::move": "on_move", "workspace::rename": "on_rename",
+              "workspace::init": "on_workspace", "workspace::focus": "on_workspace"}
+
+    def __init__(self, i3, args):
+        super().__init__(i3, args)
+        self.lock = threading.Lock()
+        self.all = FocusHistory()
+        self.by_workspace = {}  # {ws_name: FocusHistory}
+        self.workspace = {}     # {con_id: ws_name} de las ventanas del historial
+        self.names = {}         # {id del workspace: nombre}, para los renames
+
+    def start(self):
+        with state_lock:
+            self.names = dict(workspace_names)
+        focused = self.i3.get_tree().find_focused()
+        if focused is not None and focused.window:
+            self.record(focused.id)
+        for name, func in (("focus-prev", self.action_focus_prev),
+                           ("focus-nth", self.action_focus_nth),
+                           ("close-mru", self.action_close_mru)):
+            ACTIONS[name] = func
+        QUERIES["mru"] = self.query_mru
+
+    def history(self, ws_name):
+        """Historial del workspace dado, "global" para el de todos"""
+        if ws_name == "global":
+            return self.all
+        return self.by_workspace.get(ws_name) or FocusHistory()
+
+    def on_focus(self, i3, e):
+        self.record(e.container.id)
+
+    def record(self, con_id):
+        with state_lock:
+            ws_name = stack.workspace_of(con_id)
+        with self.lock:
+            self.all.touch(con_id)
+            self.move_to(con_id, ws_name)
+            if ws_name is not None:
+                self.touch_workspace(con_id, ws_name)
+
+    def touch_workspace(self, con_id, ws_name):
+        """La más reciente del workspace; la desalojada por el tope deja de
+        figurar en self.workspace (con self.lock)"""
+        evicted = self.by_workspace[ws_name].touch(con_id)
+        if evicted is not None:
+            self.workspace.pop(evicted, None)
+
+    def move_to(self, con_id, ws_name):
+        """Saca la ventana del historial de su workspace anterior (con self.lock)"""
+        old = self.workspace.pop(con_id, None)
+        history = self.by_workspace.get(old)
+        if history is not None and old != ws_name:
+            history.discard(con_id)
+            if not history.order:
+                del self.by_workspace[old]
+        if ws_name is not None:
+            self.workspace[con_id] = ws_name
+            self.by_workspace.setdefault(ws_name, FocusHistory())
+
+    def on_close(self, i3, e):
+        con_id = e.container.id
+        with self.lock:
+            self.all.discard(con_id)
+            self.move_to(con_id, None)
+
+    def on_move(self, i3, e):
+        """La ventana se lleva su lugar en el historial global; en el del
+        workspace nuevo entra como la más reciente"""
+        con_id = e.container.id
+        with state_lock:
+            ws_name = stack.workspace_of(con_id)
+        with self.lock:
+            if con_id in self.workspace and self.workspace[con_id] != ws_name:
+                self.move_to(con_id, ws_name)
+                if ws_name is not None:
+                    self.touch_workspace(con_id, ws_name)
+
+    def on_workspace(self, i3, e):
+        if e.current:
+            with self.lock:
+                self.names[e.current.id] = e.current.name
+
+    def on_rename(self, i3, e):
+        ws = e.current
+        with self.lock:
+            old_name = self.names.get(ws.id)
+            self.names[ws.id] = ws.name
+            if old_name is None or old_name == ws.name or old_name not in self.by_workspace:
+                return
+            self.by_workspace[ws.name] = self.by_workspace.pop(old_name)
+            for con_id, name in self.workspace.items():
+                if name == old_name:
+                    self.workspace[con_id] = ws.name
+
+    def pick(self, args, n):
+        """con_id en la posición n del historial que piden los args"""
+        scope = "global" if "global" in args else focused_workspace
+        with self.lock:
+            return self.history(scope).nth(n)
+
+    def action_focus_prev(self, i3, args):
+        self.focus(i3, self.pick(args, 1))
+
+    def action_focus_nth(self, i3, args):
+        numbers = [int(arg) for arg in args if arg.isdigit()]
+        self.focus(i3, self.pick(args, numbers[0] if numbers else 1))
+
+    def action_close_mru(self, i3, args):
+        con_id = self.pick(args, 0)
+        if con_id is not None:
+            i3.command(f"[con_id={con_id}] kill")
+
+    def focus(self, i3, con_id):
+        if con_id is not None:
+            i3.command(f"[con_id={con_id}] focus")
+
+    def query_mru(self, i3, args):
+        """Historial de foco: mru [workspace|global] (por defecto el enfocado)"""
+        scope = args[0] if args else focused_workspace
+        with self.lock:
+            return {"scope": scope, "windows": self.history(scope).recent()}
+
+# -------------------- uso de aplicaciones --------------------
+#
+# Por clase de ventana: lanzamientos (window::new), tiempo con foco y último
+# uso, como contadores con decaimiento exponencial (vida media de N días) en
+# una tabla de tamaño fijo. Cada evento es O(1); cada tanto se escribe el
+# ranking ya ordenado:
+#
+#   USAGE_FILE          TSV "puntaje clase lanzamientos segundos último_uso"
+#                       (también es el estado que se recupera al arrancar)
+#   USAGE_ROFI_DIR/rofi3.druncache
+#                       historial de rofi drun ("<peso> <id .desktop>"), para
+#                       usar con: rofi -show drun -cache-dir USAGE_ROFI_DIR
+
+class UsageEntry:
+    __slots__ = ("launches", "focus", "last", "updated")
+
+    def __init__(self, launches=0.0, focus=0.0, last=0.0, updated=0.0):
+        self.launches = launches  # Lanzamientos (decaídos)
+        self.focus = focus        # Segundos con foco (decaídos)
+        self.last = last          # time.time() del último uso
+        self.updated = updated    # Hasta cuándo está aplicado el decaimiento
+
+    def decay(self, now, half_life):
+        factor = 0.5 ** ((now - self.updated) / half_life) if now > self.updated else 1.0
+        self.launches *= factor
+        self.focus *= factor
+        self.updated = now
+
+    def score(self):
+        """Un lanzamiento vale lo mismo que 10 minutos de foco"""
+        return self.launches + self.focus / 600
+
+
+def application_dirs():
+    """Directorios applications/ de XDG, de mayor a menor prioridad"""
+    data_home = os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share"))
+    data_dirs = os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share").split(":")
+    bases = [data_home, os.path.join(data_home, "flatpak/exports/share"),
+             "/var/lib/flatpak/exports/share", *data_dirs]
+    return [os.path.join(base, "applications") for base in bases]
+
+def desktop_ids(dirs):
+    """{clase en minúsculas: id .desktop} según StartupWMClass o el nombre del archivo"""
+    by_class = {}
+    # Recorrido al revés: los primeros directorios (usuario) tienen prioridad
+    for apps in reversed(dirs):
+        for root, _, files in os.walk(apps):
+            for filename in files:
+                if not filename.endswith(".desktop"):
+                    continue
+                path = os.path.join(root, filename)
+                desktop_id = os.path.relpath(path, apps).replace(os.sep, "-")
+                stem = desktop_id[:-len(".desktop")].lower()
+                by_class[stem] = desktop_id
+                by_class[stem.rsplit(".", 1)[-1]] = desktop_id  # org.gnome.Nautilus
+                try:
+                    with open(path, errors="replace") as f:
+                        for line in f:
+                            if line.startswith("StartupWMClass="):
+                                by_class[line.split("=", 1)[1].strip().lower()] = desktop_id
+                                break
+                except OSError:
+                    continue
+    return by_class
+
+
+@plugin("usage")
+class Usage(Plugin):
+    """Ranking de uso por clase para ordenar el lanzador."""
+
+    events = {"window::new": "on_new", "window::focus": "on_focus"}
+
+    def __init__(self, i3, args):
+        super().__init__(i3, args)
+        self.half_life = args.usage_half_life * 86400
+        self.interval = max(args.usage_interval, 1)
+        self.lock = threading.Lock()
+        self.table = {}  # {clase: UsageEntry}, como mucho USAGE_SLOTS
+        self.focused = None  # (clase, time.monotonic() desde que tiene foco)
+        self.dirty = False
+        self.desktop_cache = (None, {})  # (mtimes de application_dirs(), desktop_ids)
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--usage-interval", type=float, default=60,
+                            help="usage: segundos entre escrituras del ranking")
+        parser.add_argument("--usage-half-life", type=float, default=7,
+                            help="usage: días en que un uso pasa a valer la mitad")
+
+    def start(self):
+        self.load()
+        threading.Thread(target=self.writer, daemon=True).start()
+        atexit.register(self.write, force=True)
+        QUERIES["usage"] = self.query_usage
+
+    def entry(self, cls, now):
+        """Entrada de la clase con el decaimiento al día (con self.lock tomado)"""
+        entry = self.table.get(cls)
+        if entry is None:
+            if len(self.table) >= USAGE_SLOTS:
+                # Tabla llena: se va la clase con menos uso (solo pasa con clases nuevas)
+                weakest = min(self.table, key=lambda c: self.table[c].score())
+                del self.table[weakest]
+            entry = self.table[cls] = UsageEntry(updated=now)
+        entry.decay(now, self.half_life)
+        return entry
+
+    def on_new(self, i3, e):
+        cls = e.container.window_class
+        if not cls:
+            return
+        now = time.time()
+        with self.lock:
+            entry = self.entry(cls, now)
+            entry.launches += 1
+            entry.last = now
+            self.dirty = True
+
+    def on_focus(self, i3, e):
+        cls = e.container.window_class
+        now = time.time()
+        with self.lock:
+            self.account_focus(now)
+            self.focused = (cls, time.monotonic()) if cls else None
+            self.dirty = True
+
+    def account_focus(self, now):
+        """Suma el tiempo con foco de la clase actual (con self.lock tomado)"""
+        if self.focused is None:
+            return
+        cls, since = self.focused
+        entry = self.entry(cls, now)
+        entry.focus += time.monotonic() - since
+        entry.last = now
+        self.focused = (cls, time.monotonic())
+
+    def ranking(self):
+        """[(puntaje, clase, entrada)] de mayor a menor, con el decaimiento al día"""
+        now = time.time()
+        with self.lock:
+            self.account_focus(now)
+            for entry in self.table.values():
+                entry.decay(now, self.half_life)
+            return sorted(((entry.score(), cls, entry) for cls, entry in self.table.items()),
+                          key=lambda item: (-item[0], item[1]))
+
+    def load(self):
+        try:
+            with open(USAGE_FILE) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines[:USAGE_SLOTS]:
+            try:
+                _, cls, launches, focus, last, updated = line.rstrip("\n").split("\t")
+                self.table[cls] = UsageEntry(float(launches), float(focus),
+                                             float(last), float(updated))
+            except ValueError:
+                continue
+
+    def write(self, force=False):
+        """Escribe el ranking solo si hubo eventos desde la última escritura.
+
+        El tiempo con foco que se acumula sin eventos no marca dirty (si no,
+        con cualquier ventana enfocada se reescribiría siempre): entra en la
+        próxima escritura o en la final (force) al salir.
+        """
+        with self.lock:
+            if not (self.dirty or force):
+                return
+            self.dirty = False
+        ranking = self.ranking()
+        atomic_write(USAGE_FILE, "".join(
+            f"{score:.3f}\t{cls}\t{e.launches:.3f}\t{e.focus:.1f}\t{e.last:.0f}\t{e.updated:.0f}\n"
+            for score, cls, e in ranking))
+
+        # rofi ordena drun por este historial (mayor peso primero)
+        by_class = self.desktop_ids()
+        lines, seen = [], set()
+        for score, cls, _ in ranking:
+            desktop_id = by_class.get(cls.lower())
+            if desktop_id and desktop_id not in seen:
+                seen.add(desktop_id)
+                lines.append(f"{max(int(score * 100), 1)} {desktop_id}\n")
+        atomic_write(os.path.join(USAGE_ROFI_DIR, "rofi3.druncache"), "".join(lines))
+
+    def desktop_ids(self):
+        """desktop_ids() se vuelve a calcular solo si cambió algún directorio"""
+        dirs = application_dirs()
+        stamp = tuple(os.stat(d).st_mtime if os.path.isdir(d) else 0 for d in dirs)
+        if stamp != self.desktop_cache[0]:
+            self.desktop_cache = (stamp, desktop_ids(dirs))
+        return self.desktop_cache[1]
+
+    def writer(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as ex:
+                print(f"window-tracker: no se pudo escribir el ranking de uso: {ex}",
+                      file=sys.stderr)
+
+    def query_usage(self, i3, args):
+        """Ranking actual: usage [cantidad]"""
+        limit = int(args[0]) if args else 20
+        return {"ranking": [{"class": cls, "score": round(score, 3),
+                             "launches": round(e.launches, 2), "focus": round(e.focus),
+                             "last": e.last}
+                            for score, cls, e in self.ranking()[:limit]]}
+
+# -------------------- taps --------------------
+#
+# Doble/triple tap de cualquier tecla, sin archivos ni procesos por pulsación
+# (lo que hacía hyper-triple-tap.sh): la tecla se bindea a
+# "nop tracker tap <nombre>" y taps.json dice qué hacer con cada cantidad:
+#
+#     {"hyper": {"window_ms": 400, "2": "workspace Z", "3": "workspace 1"}}
+#
+# Si la cantidad alcanzada es la mayor configurada el comando corre al
+# instante; si no, cuando vence la ventana sin otra pulsación.
+
+DEFAULT_TAPS = {"hyper": {"window_ms": 400, "2": "workspace Z"}}
+
+def load_taps(path):
+    """{nombre: (ventana en segundos, {cantidad: comando de i3})}"""
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = DEFAULT_TAPS
+    rules = {}
+    for name, rule in config.items():
+        commands = {int(count): command for count, command in rule.items() if count.isdigit()}
+        rules[name] = (rule.get("window_ms", 400) / 1000, commands)
+    return rules
+
+@plugin("taps")
+class Taps(Plugin):
+    """Detecta multi-taps de los bindings "nop tracker tap <nombre>"."""
+
+    def __init__(self, i3, args):
+        super().__init__(i3, args)
+        self.rules = load_taps(args.taps_file)
+        self.pending = {}  # {nombre: (pulsaciones, instante de la última, timer)}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument("--taps-file", default=TAPS_FILE,
+                            help="taps: ventanas y comandos por cantidad de pulsaciones")
+
+    def start(self):
+        ACTIONS["tap"] = self.tap
+
+    def tap(self, i3, args):
+        name = args[0] if args else ""
+        if name not in self.rules:
+            print(f"window-tracker: tap sin configurar: {name}", file=sys.stderr)
+            return
+        window, commands = self.rules[name]
+        now = time.monotonic()
+        with self.lock:
+            count, last, timer = self.pending.pop(name, (0, None, None))
+            if timer is not None:
+                timer.cancel()
+            if last is None or now - last > window:
+                count = 0
+            count += 1
+            if count < max(commands, default=0):
+                timer = threading.Timer(window, self.expire, (name,))
+                timer.daemon = True
+                self.pending[name] = (count, now, timer)
+                timer.start()
+                return
+        self.run(commands.get(count))
+
+    def expire(self, name):
+        """Venció la ventana sin otra pulsación: vale lo contado hasta ahora"""
+        with self.lock:
+            count, last, timer = self.pending.pop(name, (0, None, None))
+        self.run(self.rules[name][1].get(count))
+
+    def run(self, command):
+        if command:
+            self.i3.command(command)
+
+# ==================== MODO ASYNCIO ====================
+#
+# Con --async los eventos entran a una cola desde i3ipc.aio y se drenan por
+# lotes: los window::move repetidos de un mismo con_id se fusionan, el árbol
+# se pide una sola vez por lote y el estado se actualiza de una vez. La
+# persistencia y las respuestas del socket corren en tareas/hilos aparte,
+# así un disco lento nunca frena la lectura de eventos.
+
+def coalesce_events(batch):
+    """Deja solo el último window::move de cada con_id (el árbol ya tiene el destino final)"""
+    last_move = {}
+    for i, (name, e) in enumerate(batch):
+        if name == "window::move":
+            last_move[e.container.id] = i
+    return [(name, e) for i, (name, e) in enumerate(batch)
+            if name != "window::move" or last_move[e.container.id] == i]
+
+async def process_batches(aio_i3, queue, i3):
+    loop = asyncio.get_running_loop()
+    # Un solo hilo para acciones: se ejecutan en el orden en que se pulsaron
+    actions = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    while True:
+        batch = [await queue.get()]
+        # i3ipc.aio entrega un evento por vuelta del loop: sin esperar, cada
+        # lote tendría uno solo. Se cede el loop mientras la cola siga
+        # creciendo, como mucho _batch_window (un evento suelto no espera)
+        deadline = loop.time() + _batch_window
+        while True:
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if loop.time() >= deadline:
+                break
+            await asyncio.sleep(0)
+            if queue.empty():
+                break
+
+        received = {id(e): when for name, e, when in batch}
+        events = coalesce_events([(name, e) for name, e, when in batch])
+        metrics.observe_batch(len(batch), len(batch) - len(events))
+        names = {name for name, e in events}
+        tree = await aio_i3.get_tree() if names & NEEDS_TREE else None
+        workspaces = await aio_i3.get_workspaces() if names & NEEDS_WORKSPACES else None
+        apply_events([(n, e) for n, e in events if n != "binding"], tree, workspaces)
+
+        # Acciones y plugins usan la conexión síncrona en un hilo del pool
+        for name, e in events:
+            if name == "binding":
+                loop.run_in_executor(actions, on_binding, i3, e)
+            elif name == "shutdown":
+                on_shutdown(i3, e, aio_i3.main_quit)
+            if wants_event(name):
+                loop.run_in_executor(actions, dispatch, i3, e, name)
+
+        now = time.perf_counter()
+        for name, e in events:
+            metrics.observe_event(name, now - received[id(e)])
+
+async def flush_worker(dirty):
+    """Persistencia write-behind: como mucho una escritura cada _flush_delay"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await dirty.wait()
+        await asyncio.sleep(_flush_delay)
+        dirty.clear()
+        await loop.run_in_executor(None, flush_stack)
+
+async def serve_query(i3, reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        async for raw in reader:
+            line = raw.decode("utf-8", "replace")
+            reply = await loop.run_in_executor(None, handle_query, i3, line)
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def async_main(i3):
+    global _on_dirty
+    from i3ipc.aio import Connection as AioConnection
+
+    loop = asyncio.get_running_loop()
+    dirty = asyncio.Event()
+    _on_dirty = dirty.set
+
+    aio_i3 = await AioConnection(auto_reconnect=True).connect()
+    queue = asyncio.Queue()
+    for base in event_bases():
+        aio_i3.on(base, lambda conn, e, base=base:
+                  queue.put_nowait((event_name(base, e), e, time.perf_counter())))
+
+    with private_socket(SOCKET_PATH):
+        await asyncio.start_unix_server(lambda r, w: serve_query(i3, r, w),
+                                        path=SOCKET_PATH)
+    tasks = [asyncio.ensure_future(process_batches(aio_i3, queue, i3)),
+             asyncio.ensure_future(flush_worker(dirty))]
+    loop.add_signal_handler(signal.SIGTERM, aio_i3.main_quit)
+    if _profiler is not None:
+        loop.add_signal_handler(signal.SIGUSR1, dump_profile)
+
+    try:
+        await aio_i3.main()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tracker del orden de ventanas de i3")
+    parser.add_argument("--plugins", default="",
+                        help=f"plugins a activar, separados por coma ({', '.join(PLUGINS)})")
+    parser.add_argument("--flush-ms", type=int, default=FLUSH_DELAY_MS,
+                        help="antigüedad máxima (ms) del stack en disco")
+    parser.add_argument("--journal", action="store_true",
+                        help="persistir con journal append-only + compactación")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="procesar eventos por lotes con i3ipc.aio")
+    parser.add_argument("--batch-ms", type=float, default=BATCH_WINDOW_MS,
+                        help="con --async, espera máxima (ms) para juntar eventos en un lote")
+    parser.add_argument("--metrics-file", nargs="?", const=METRICS_FILE, metavar="PATH",
+                        help=f"escribir métricas Prometheus (por defecto {METRICS_FILE})")
+    parser.add_argument("--metrics-interval", type=float, default=15,
+                        help="segundos entre escrituras de --metrics-file")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"perfilar con cProfile; SIGUSR1 vuelca a {PROFILE_FILE}")
+    for cls in PLUGINS.values():
+        cls.add_arguments(parser)
+
+    args = parser.parse_args()
+    args.plugins = [name for name in args.plugins.split(",") if name]
+    for name in args.plugins:
+        if name not in PLUGINS:
+            parser.error(f"plugin desconocido: {name}")
+    return args
 
 def main():
-    i3 = i3ipc.Connection()
+    global _flush_delay, _batch_window, _profiler
+    load_plugin_dir()
+    args = parse_args()
+    _flush_delay = max(args.flush_ms, 0) / 1000
+    _batch_window = max(args.batch_ms, 0) / 1000
 
-    # Inicializar con ventanas existentes
+    if args.profile:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        signal.signal(signal.SIGUSR1, dump_profile)
+
+    # auto_reconnect: después de "i3-msg restart" sigue el mismo proceso
+    i3 = i3ipc.Connection(auto_reconnect=True)
+
+    # Recuperar el orden aprendido antes de mirar el árbol
+    journal = Journal(JOURNAL_FILE) if args.journal else None
+    recover_stack(journal)
+    stack.journal = journal
+
+    # Reconciliar con las ventanas existentes
     init_stack(i3)
 
-    # Suscribirse a eventos
-    i3.on("window::new", on_window_new)
-    i3.on("window::close", on_window_close)
-    i3.on("window::move", on_window_move)
+    start_plugins(i3, args)
+
+    if args.metrics_file:
+        threading.Thread(target=metrics_writer, daemon=True,
+                         args=(args.metrics_file, max(args.metrics_interval, 1))).start()
+        atexit.register(write_metrics, args.metrics_file)
+
+    # No perder cambios pendientes al salir (atexit corre en orden inverso:
+    # el flush final queda incluido en las métricas)
+    atexit.register(flush_stack, compact=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if args.use_async:
+        # i3 (síncrona) queda para comandos y consultas desde hilos del pool
+        asyncio.run(async_main(i3))
+        return
+
+    # Consultas rápidas (close-newest.sh, tracker-client.py)
+    start_query_server(i3)
+
+    # Una sola suscripción para el stack y todos los plugins
+    for base in event_bases():
+        i3.on(base, lambda conn, e, base=base: on_event(conn, e, base))
 
     i3.main()
 
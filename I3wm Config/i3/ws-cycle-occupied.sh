@@ -4,6 +4,11 @@
 
 direction="${1:-next}"
 
+# Fast path: window-tracker.py keeps an index of occupied workspaces
+"$HOME/.config/i3/tracker-client.py" ws-cycle "$direction" > /dev/null 2>&1
+[ $? -ne 2 ] && exit 0
+
+# Fallback without the daemon: walk the full tree
 # Get current focused workspace
 current=$(i3-msg -t get_workspaces | jq -r '.[] | select(.focused==true) | .num')
 
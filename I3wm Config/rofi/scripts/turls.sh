@@ -197,50 +197,9 @@ record_wait() {
 # ============================================================================
 
 execute_turl() {
-    local filepath="$1"
-    local steps=$(jq -c '.steps[]' "$filepath")
-
-    while IFS= read -r step; do
-        local type=$(echo "$step" | jq -r '.type')
-
-        case "$type" in
-            "url")
-                local url=$(echo "$step" | jq -r '.value')
-                xdg-open "$url" &
-                sleep 1.5
-                ;;
-            "click")
-                local x=$(echo "$step" | jq -r '.x')
-                local y=$(echo "$step" | jq -r '.y')
-                xdotool mousemove "$x" "$y"
-                sleep 0.1
-                xdotool click 1
-                sleep 0.3
-                ;;
-            "input")
-                local prompt=$(echo "$step" | jq -r '.prompt // empty')
-                local value=$(echo "$step" | jq -r '.value // empty')
-
-                if [[ -n "$prompt" ]]; then
-                    value=$(rofi_input "$prompt" "")
-                    [[ -z "$value" ]] && return 1
-                fi
-
-                sleep 0.2
-                xdotool type --clearmodifiers "$value"
-                ;;
-            "key")
-                local key=$(echo "$step" | jq -r '.value')
-                sleep 0.1
-                xdotool key --clearmodifiers "$key"
-                sleep 0.2
-                ;;
-            "wait")
-                local seconds=$(echo "$step" | jq -r '.seconds')
-                sleep "$seconds"
-                ;;
-        esac
-    done <<< "$steps"
+    # El ejecutor vive en turls.py (modo headless, sin GTK): lee el JSON una
+    # sola vez en vez de un jq por campo y soporta todos los tipos de paso
+    python3 "$URL_DIR/turls.py" run "$1"
 }
 
 list_turls() {
@@ -351,18 +310,9 @@ main_menu() {
 # ============================================================================
 
 if [[ -n "$1" ]]; then
-    shopt -s nullglob
-    for f in "$SAVED_DIR"/*.json; do
-        [[ -f "$f" ]] || continue
-        name=$(jq -r '.name' "$f")
-        if [[ "$name" == "$1" ]] || [[ "$(basename "$f" .json)" == "$1" ]]; then
-            execute_turl "$f"
-            exit 0
-        fi
-    done
-    shopt -u nullglob
-    echo "URL no encontrado: $1"
-    exit 1
+    # Busca por nombre o nombre de archivo; sale con 2 si no existe
+    execute_turl "$1"
+    exit $?
 fi
 
 main_menu
@@ -1,133 +1,99 @@
 #!/usr/bin/env python3
-"""TURLS - Turbo URLs - Grabador de navegación"""
+"""TURLS - Turbo URLs - Grabador de navegación
+
+Uso:
+    turls.py                      abre el grabador/lanzador (GTK)
+    turls.py --list               lista los workflows guardados
+    turls.py run <nombre> [--overlay]
+                                  ejecuta un workflow sin cargar la ventana
+                                  principal; <nombre> puede ser el nombre,
+                                  el nombre de archivo sin .json o una ruta
+    turls.py --daemon             modo residente: la app queda oculta y
+                                  precargada escuchando en SOCKET_PATH
+
+La interfaz GTK vive en turls_gtk.py y se importa solo cuando hace falta
+una ventana: `run` no carga GTK salvo que se pida el overlay de estado, y
+PIL solo se carga cuando un paso tiene snapshot o propiedades que verificar.
+Si hay un turls residente, `turls.py`, `show` y `run` solo le envían la
+orden por el socket (--no-daemon fuerza la ejecución local).
+"""
 
-import gi
-gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GLib, Pango
-import cairo
+import argparse
+import hashlib
 import json
 import os
+import shlex
+import socket
 import subprocess
+import sys
 import threading
 import time
 from pathlib import Path
-from datetime import date
 import math
 import base64
 from io import BytesIO
-
-# Intentar importar PIL para comparación de imágenes
-try:
-    from PIL import Image, ImageChops, ImageFilter
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 SAVED_DIR = Path.home() / ".config/rofi/turls/saved"
 SAVED_DIR.mkdir(parents=True, exist_ok=True)
 SNAP_SIZE = 60  # Tamaño de la captura alrededor del click
+PROPS_SIZE = (120, 60)  # Región para OCR y color del elemento
+ROFI_THEME = Path.home() / ".config/rofi/turls-theme.rasi"
+SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), "turls.sock")
+
+# PIL se importa bajo demanda (ver load_pil): None = aún no intentado
+HAS_PIL = None
+Image = ImageChops = None
+
+
+def load_pil():
+    """Importa PIL la primera vez que se necesita. Retorna True si está disponible."""
+    global HAS_PIL, Image, ImageChops
+    if HAS_PIL is None:
+        try:
+            from PIL import Image, ImageChops
+            HAS_PIL = True
+        except ImportError:
+            HAS_PIL = False
+    return HAS_PIL
+
+
+# NumPy se importa bajo demanda (ver load_numpy): None = aún no intentado
+HAS_NUMPY = None
+np = None
+
+
+def load_numpy():
+    """Importa NumPy la primera vez que se necesita. Retorna True si está disponible."""
+    global HAS_NUMPY, np
+    if HAS_NUMPY is None:
+        try:
+            import numpy as np
+            HAS_NUMPY = True
+        except ImportError:
+            HAS_NUMPY = False
+    return HAS_NUMPY
 
-CSS = """
-* {
-    font-family: sans-serif;
-    font-size: 14px;
-}
-window {
-    background-color: #1a1a1a;
-    border: 2px solid #9683a9;
-}
-button {
-    background: #3d3d3d;
-    color: #ffffff;
-    border: 1px solid #505050;
-    padding: 10px 20px;
-    margin: 2px;
-}
-button:hover {
-    background: #9683a9;
-    color: #000000;
-}
-entry {
-    background: #2d2d2d;
-    color: #ffffff;
-    border: 1px solid #505050;
-    padding: 10px;
-}
-label {
-    color: #c0c0c0;
-    padding: 4px;
-}
-list {
-    background-color: #1a1a1a;
-}
-list row {
-    background-color: #1a1a1a;
-    padding: 8px 12px;
-}
-list row:selected {
-    background-color: #9683a9;
-}
-list row:selected label {
-    color: #000000;
-}
-.title {
-    font-size: 16px;
-    font-weight: bold;
-    color: #9683a9;
-    padding: 8px;
-}
-.info {
-    font-size: 13px;
-    color: #888888;
-}
-.recording {
-    background-color: #4a1a1a;
-}
-.icon-btn {
-    background: transparent;
-    border: none;
-    padding: 2px 6px;
-    margin: 0;
-    min-width: 0;
-    opacity: 0.6;
-}
-.icon-btn:hover {
-    opacity: 1;
-    background: rgba(150, 131, 169, 0.3);
-}
-.small-btn {
-    padding: 6px 14px;
-    font-size: 13px;
-}
-.step-item {
-    font-size: 12px;
-    padding: 2px 0;
-}
-.overlay-window {
-    background-color: rgba(26, 26, 26, 0.95);
-    border-radius: 12px;
-}
-.step-label {
-    font-size: 18px;
-    font-weight: bold;
-    color: #9683a9;
-}
-.step-desc {
-    font-size: 14px;
-    color: #e0e0e0;
-}
-.countdown-label {
-    font-size: 72px;
-    font-weight: bold;
-    color: #9683a9;
-}
-.typing-label {
-    font-size: 24px;
-    font-family: monospace;
-    color: #9683a9;
-    letter-spacing: 4px;
-}
-"""
+
+# python-xlib se importa bajo demanda (ver load_xlib): None = aún no intentado
+HAS_XLIB = None
+X = XK = xdisplay = xevent = None
+
+
+def load_xlib():
+    """Importa python-xlib la primera vez que se necesita. Retorna True si está disponible."""
+    global HAS_XLIB, X, XK, xdisplay, xevent
+    if HAS_XLIB is None:
+        try:
+            from Xlib import X, XK
+            from Xlib import display as xdisplay
+            from Xlib.protocol import event as xevent
+            HAS_XLIB = True
+        except ImportError:
+            HAS_XLIB = False
+    return HAS_XLIB
 
 
 def get_screen_size():
@@ -160,9 +126,9 @@ def coords_to_percent(x, y):
     return (x / sw, y / sh)
 
 
-def percent_to_coords(px, py):
+def percent_to_coords(px, py, size=None):
     """Convierte porcentajes a coordenadas absolutas"""
-    sw, sh = get_screen_size()
+    sw, sh = size or get_screen_size()
     return (int(px * sw), int(py * sh))
 
 
@@ -189,102 +155,257 @@ def wait_for_click():
     return None, None
 
 
-def capture_region(x, y, size=SNAP_SIZE):
-    """Captura una región de la pantalla alrededor de un punto"""
-    if not HAS_PIL:
-        return None
+# ==================== CAPTURA DE PANTALLA ====================
+
+class Frame:
+    """Región de pantalla en memoria: píxeles crudos, sin codificar"""
+
+    def __init__(self, width, height, data, rawmode, stride=0, x=0, y=0):
+        self.x = x  # Origen de la región en la pantalla
+        self.y = y
+        self.width = width
+        self.height = height
+        self.data = data
+        self.rawmode = rawmode  # Orden de bytes de `data` (modo raw de PIL)
+        self.stride = stride
+
+    def image(self):
+        """Imagen PIL RGB sobre el buffer (conversión en C, sin PNG de por medio)"""
+        return Image.frombuffer("RGB", (self.width, self.height), self.data,
+                                "raw", self.rawmode, self.stride, 1)
+
+    def crop_around(self, x, y, width, height):
+        """Subregión centrada en (x, y), recortada igual que grab_around (copia el buffer)"""
+        x1 = max(self.x, x - width // 2)
+        y1 = max(self.y, y - height // 2)
+        x2 = min(self.x + self.width, max(0, x - width // 2) + width)
+        y2 = min(self.y + self.height, max(0, y - height // 2) + height)
+        if (x1, y1, x2, y2) == (self.x, self.y, self.x + self.width, self.y + self.height):
+            return self
+        channels = 3 if self.rawmode == "RGB" else 4
+        stride = self.stride or self.width * channels
+        start = (x1 - self.x) * channels
+        rows = [self.data[(y1 - self.y + r) * stride + start:][:(x2 - x1) * channels]
+                for r in range(y2 - y1)]
+        return Frame(x2 - x1, y2 - y1, b"".join(rows), self.rawmode, x=x1, y=y1)
+
+    def gray(self):
+        """Luminancia (h, w) en float32 leída directamente del buffer (requiere NumPy)"""
+        channels = 3 if self.rawmode == "RGB" else 4
+        stride = self.stride or self.width * channels
+        pixels = np.frombuffer(self.data, np.uint8).reshape(self.height, stride)
+        pixels = pixels[:, :self.width * channels].reshape(self.height, self.width, channels)
+        r, g, b = {"BGRX": (2, 1, 0), "XRGB": (1, 2, 3), "RGB": (0, 1, 2)}[self.rawmode]
+        return to_gray(pixels[..., r], pixels[..., g], pixels[..., b])
+
+
+class XlibCapture:
+    """Captura con XGetImage sobre una conexión X persistente (python-xlib).
+
+    Tiene su propia conexión y un lock: se usa tanto desde el hilo de
+    grabación como desde Runner, y python-xlib no es thread-safe.
+    """
 
-    half = size // 2
-    x1 = max(0, x - half)
-    y1 = max(0, y - half)
-
-    try:
-        # Usar import de ImageMagick para capturar
+    def __init__(self):
+        if not load_xlib():
+            raise ImportError("python-xlib no está instalado")
+        self.display = xdisplay.Display()
+        screen = self.display.screen()
+        if screen.root_depth not in (24, 32):
+            self.display.close()
+            raise OSError(f"profundidad de color no soportada: {screen.root_depth}")
+        self.root = screen.root
+        lsb = self.display.display.info.image_byte_order == X.LSBFirst
+        self.rawmode = "BGRX" if lsb else "XRGB"
+        self.lock = threading.Lock()
+
+    def grab(self, x, y, width, height):
+        with self.lock:
+            # Recortar a la pantalla (XGetImage falla si el rectángulo se sale)
+            geometry = self.root.get_geometry()
+            width = min(width, geometry.width - x)
+            height = min(height, geometry.height - y)
+            if width <= 0 or height <= 0:
+                return None
+            reply = self.root.get_image(x, y, width, height, X.ZPixmap, 0xffffffff)
+        return Frame(width, height, reply.data, self.rawmode, x=x, y=y)
+
+
+class ImportCapture:
+    """Fallback con ImageMagick `import` (un proceso y un PNG por captura)"""
+
+    def grab(self, x, y, width, height):
         result = subprocess.run(
-            ["import", "-window", "root", "-crop", f"{size}x{size}+{x1}+{y1}", "png:-"],
+            ["import", "-window", "root", "-crop", f"{width}x{height}+{x}+{y}", "png:-"],
             capture_output=True,
             timeout=2
         )
-        if result.returncode == 0:
-            return base64.b64encode(result.stdout).decode('utf-8')
-    except:
-        pass
-    return None
+        if result.returncode != 0:
+            return None
+        img = Image.open(BytesIO(result.stdout)).convert("RGB")
+        return Frame(img.width, img.height, img.tobytes(), "RGB", x=x, y=y)
 
 
-def detect_element_properties(x, y):
-    """Detecta propiedades del elemento en la posición (texto, color)"""
-    props = {}
+_capture = None
 
-    # Capturar región más grande para OCR (120x60 píxeles)
-    half_w, half_h = 60, 30
-    x1 = max(0, x - half_w)
-    y1 = max(0, y - half_h)
 
+def get_capture():
+    """Backend de captura compartido: XGetImage si hay python-xlib, si no `import`"""
+    global _capture
+    if _capture is None:
+        try:
+            _capture = XlibCapture()
+        except Exception:  # Sin python-xlib, sin DISPLAY o visual raro
+            _capture = ImportCapture()
+    return _capture
+
+
+def grab_around(x, y, width, height):
+    """Captura una región de width x height centrada en (x, y). None si falla."""
+    if not load_pil():
+        return None
     try:
-        # Capturar imagen para análisis
+        return get_capture().grab(max(0, x - width // 2), max(0, y - height // 2),
+                                  width, height)
+    except:
+        return None
+
+
+def encode_snap(frame):
+    """Codifica una región como PNG base64 (formato del campo "snap" del JSON)"""
+    buf = BytesIO()
+    frame.image().save(buf, "PNG")
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+# ==================== OCR ====================
+
+OCR_LANGS = "eng+spa"
+OCR_CACHE_SIZE = 256  # Resultados recordados (por hash de los píxeles)
+
+
+class OcrEngine:
+    """OCR residente con caché LRU por hash de los píxeles recortados.
+
+    Con tesserocr mantiene una instancia de la API de tesseract con los
+    modelos ya cargados; sin él cae al CLI (un proceso por región), pero
+    la caché sigue evitando repetir regiones idénticas.
+    """
+
+    def __init__(self):
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.api_lock = threading.Lock()  # La API de tesseract no es thread-safe
+        self.api = None
+        try:
+            from tesserocr import PyTessBaseAPI, PSM
+            self.api = PyTessBaseAPI(lang=OCR_LANGS, psm=PSM.SINGLE_LINE)
+        except Exception:  # Sin tesserocr o sin los idiomas instalados
+            pass
+
+    def text(self, frame):
+        """Texto reconocido en la región (cadena vacía si no hay nada)"""
+        key = hashlib.blake2b(frame.data, digest_size=16)
+        key.update(f"{frame.width}x{frame.height}:{frame.rawmode}:{frame.stride}".encode())
+        key = key.digest()
+
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        text = self._recognize(frame.image())
+
+        with self.cache_lock:
+            self.cache[key] = text
+            while len(self.cache) > OCR_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return text
+
+    def _recognize(self, img):
+        if self.api:
+            with self.api_lock:
+                self.api.SetImage(img)
+                return self.api.GetUTF8Text()
+
+        # tesseract necesita una imagen codificada por stdin
+        buf = BytesIO()
+        img.save(buf, "PNG")
         result = subprocess.run(
-            ["import", "-window", "root", "-crop", f"120x60+{x1}+{y1}", "png:-"],
+            ["tesseract", "stdin", "stdout", "-l", OCR_LANGS, "--psm", "7"],
+            input=buf.getvalue(),
             capture_output=True,
-            timeout=2
+            timeout=3
         )
-        if result.returncode != 0:
-            return props
+        return result.stdout.decode('utf-8')
 
-        img_data = result.stdout
 
-        # Detectar texto con OCR
-        try:
-            ocr_result = subprocess.run(
-                ["tesseract", "stdin", "stdout", "-l", "eng+spa", "--psm", "7"],
-                input=img_data,
-                capture_output=True,
-                timeout=3
-            )
-            text = ocr_result.stdout.decode('utf-8').strip()
-            # Limpiar texto (quitar caracteres extraños)
-            text = ''.join(c for c in text if c.isalnum() or c.isspace()).strip()
-            if text and len(text) >= 2:
-                props["text"] = text
-        except:
-            pass
+_ocr = None
+
+
+def get_ocr():
+    """Motor de OCR compartido (se crea la primera vez; carga los modelos una vez)"""
+    global _ocr
+    if _ocr is None:
+        _ocr = OcrEngine()
+    return _ocr
+
+
+def element_text(frame):
+    """Texto del elemento por OCR, limpio (None si no hay texto útil)"""
+    try:
+        text = get_ocr().text(frame).strip()
+    except:
+        return None
+    # Limpiar texto (quitar caracteres extraños)
+    text = ''.join(c for c in text if c.isalnum() or c.isspace()).strip()
+    if text and len(text) >= 2:
+        return text
+    return None
+
+
+def element_color(frame):
+    """Color promedio del centro de la región (#rrggbb)"""
+    img = frame.image()
+    # Obtener color del centro
+    cx, cy = img.width // 2, img.height // 2
+    # Promediar área pequeña del centro
+    colors = []
+    for dx in range(-3, 4):
+        for dy in range(-3, 4):
+            px = min(max(0, cx + dx), img.width - 1)
+            py = min(max(0, cy + dy), img.height - 1)
+            colors.append(img.getpixel((px, py)))
+
+    # Promediar colores
+    avg_r = sum(c[0] for c in colors) // len(colors)
+    avg_g = sum(c[1] for c in colors) // len(colors)
+    avg_b = sum(c[2] for c in colors) // len(colors)
+    return f"#{avg_r:02x}{avg_g:02x}{avg_b:02x}"
+
+
+def detect_element_properties(x, y):
+    """Detecta propiedades del elemento en la posición (texto, color)"""
+    props = {}
 
-        # Detectar color dominante
-        if HAS_PIL:
-            try:
-                img = Image.open(BytesIO(img_data))
-                # Obtener color del centro
-                cx, cy = img.width // 2, img.height // 2
-                # Promediar área pequeña del centro
-                colors = []
-                for dx in range(-3, 4):
-                    for dy in range(-3, 4):
-                        px = min(max(0, cx + dx), img.width - 1)
-                        py = min(max(0, cy + dy), img.height - 1)
-                        colors.append(img.getpixel((px, py)))
-
-                # Promediar colores
-                if colors:
-                    if isinstance(colors[0], tuple):
-                        avg_r = sum(c[0] for c in colors) // len(colors)
-                        avg_g = sum(c[1] for c in colors) // len(colors)
-                        avg_b = sum(c[2] for c in colors) // len(colors)
-                        props["color"] = f"#{avg_r:02x}{avg_g:02x}{avg_b:02x}"
-            except:
-                pass
+    # Capturar región más grande para OCR (120x60 píxeles)
+    frame = grab_around(x, y, *PROPS_SIZE)
+    if not frame:
+        return props
 
+    try:
+        text = element_text(frame)
+        if text:
+            props["text"] = text
+        props["color"] = element_color(frame)
     except:
         pass
 
     return props
 
 
-def verify_element_properties(x, y, saved_props):
-    """Verifica si las propiedades actuales coinciden con las guardadas"""
-    if not saved_props:
-        return True, None
-
-    current = detect_element_properties(x, y)
+def props_mismatches(saved_props, current):
+    """Diferencias entre las propiedades guardadas y las actuales (lista de textos)"""
     mismatches = []
 
     # Verificar texto
@@ -319,1602 +440,970 @@ def verify_element_properties(x, y, saved_props):
         except:
             pass
 
-    if mismatches:
-        return False, mismatches
-
-    return True, None
-
-
-def compare_regions(snap_b64, x, y, threshold=0.75):
-    """Compara una captura guardada con la región actual. Retorna True si son similares."""
-    if not HAS_PIL or not snap_b64:
-        return True  # Si no hay PIL o snapshot, continuar sin verificar
-
-    try:
-        # Decodificar imagen guardada
-        saved_img = Image.open(BytesIO(base64.b64decode(snap_b64)))
-
-        # Capturar región actual
-        current_b64 = capture_region(x, y, saved_img.width)
-        if not current_b64:
-            return True  # No se pudo capturar, continuar
+    return mismatches
+
+
+# ==================== COMPARACIÓN DE REGIONES ====================
+
+# Métrica y umbral por defecto para verificar el snapshot de un click. Cada
+# paso puede fijar los suyos en el JSON con "snap_metric" y "snap_threshold".
+#   mad:  1 - diferencia absoluta media (la comparación original)
+#   ncc:  correlación cruzada normalizada (ignora cambios de brillo/contraste)
+#   ssim: similitud estructural en ventanas de 7x7 (tolera antialiasing y
+#         estados hover que solo cambian el color)
+# Umbrales medidos con recortes de 60x60 de páginas de texto sobre blanco
+# (regiones distintas vs. la misma con hover o ruido): en páginas con mucho
+# blanco mad acepta casi todo a 0.75, ssim separa recién desde ~0.85 y ncc
+# deja un margen amplio (distintas <= 0.78, misma >= 0.99).
+SNAP_METRIC = "ncc"
+SNAP_THRESHOLDS = {"mad": 0.75, "ncc": 0.8, "ssim": 0.85}
+SSIM_WINDOW = 7
+
+
+def to_gray(r, g, b):
+    """Luminancia ITU-R 601 (la misma que Image.convert('L'))"""
+    return (r * np.float32(0.299) + g * np.float32(0.587) + b * np.float32(0.114)).astype(np.float32)
+
+
+def mad_similarity(a, b):
+    return 1.0 - float(np.abs(a - b).mean()) / 255
+
+
+def ncc_similarity(a, b):
+    mean_a, mean_b = float(a.mean()), float(b.mean())
+    a = a - mean_a
+    b = b - mean_b
+    denom = math.sqrt(float((a * a).sum()) * float((b * b).sum()))
+    if denom < 1e-6:
+        # Región lisa: la correlación no está definida, comparar niveles
+        return 1.0 - abs(mean_a - mean_b) / 255
+    return float((a * b).sum()) / denom
+
+
+def box_means(planes, kh, kw=None):
+    """Medias en todas las ventanas kh x kw completas de cada plano (imagen integral)"""
+    kw = kw or kh
+    s = np.zeros((len(planes), planes[0].shape[0] + 1, planes[0].shape[1] + 1))
+    s[:, 1:, 1:] = np.stack(planes).cumsum(1).cumsum(2)
+    return (s[:, kh:, kw:] - s[:, :-kh, kw:] - s[:, kh:, :-kw] + s[:, :-kh, :-kw]) / (kh * kw)
+
+
+def ssim_similarity(a, b, k=SSIM_WINDOW):
+    k = min(k, *a.shape)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    # Una sola pasada de sumas acumuladas para las cinco medias locales
+    mu_a, mu_b, aa, bb, ab = box_means((a, b, a * a, b * b, a * b), k)
+    var_a = aa - mu_a * mu_a
+    var_b = bb - mu_b * mu_b
+    cov = ab - mu_a * mu_b
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / \
+           ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return float(ssim.mean())
+
+
+SNAP_METRICS = {
+    "mad": mad_similarity,
+    "ncc": ncc_similarity,
+    "ssim": ssim_similarity,
+}
 
-        current_img = Image.open(BytesIO(base64.b64decode(current_b64)))
 
-        # Asegurar mismo tamaño
-        if saved_img.size != current_img.size:
-            current_img = current_img.resize(saved_img.size)
+@lru_cache(maxsize=256)
+def decode_snap(snap_b64):
+    """Decodifica un snapshot guardado (cacheado: se repite en cada ejecución)"""
+    img = Image.open(BytesIO(base64.b64decode(snap_b64)))
+    img.load()
+    return img
 
-        # Convertir a escala de grises para comparación
-        saved_gray = saved_img.convert('L')
-        current_gray = current_img.convert('L')
 
-        # Calcular diferencia
-        diff = ImageChops.difference(saved_gray, current_gray)
+@lru_cache(maxsize=256)
+def snap_gray(snap_b64):
+    """Snapshot guardado como luminancia float32 (cacheado)"""
+    return np.asarray(decode_snap(snap_b64).convert("L"), dtype=np.float32)
 
-        # Calcular similitud (0-1)
-        diff_pixels = list(diff.getdata())
-        total_diff = sum(diff_pixels)
-        max_diff = 255 * len(diff_pixels)
-        similarity = 1 - (total_diff / max_diff)
 
-        return similarity >= threshold
-
-    except Exception as e:
-        return True  # En caso de error, continuar
+def snap_similarity(snap_b64, frame, metric=SNAP_METRIC):
+    """Similitud (0-1, ncc puede ser negativa) entre un snapshot y una captura"""
+    saved = snap_gray(snap_b64)
+    current = frame.gray()
+    if saved.shape != current.shape:
+        # Captura recortada por el borde de pantalla: comparar la zona común
+        h = min(saved.shape[0], current.shape[0])
+        w = min(saved.shape[1], current.shape[1])
+        saved, current = saved[:h, :w], current[:h, :w]
+    return SNAP_METRICS[metric](saved, current)
 
 
-# ==================== CLICK INDICATOR WINDOW ====================
+# Self-healing: si el snapshot no coincide en el punto grabado, buscarlo en
+# una ventana alrededor y hacer click donde esté (si el match es confiable)
+LOCATE_SIZE = 600        # Lado de la ventana de búsqueda (px)
+LOCATE_THRESHOLD = 0.8   # NCC mínima para aceptar la nueva posición
+LOCATE_MARGIN = 0.05     # Ventaja mínima sobre el segundo candidato (elementos repetidos)
 
-class ClickIndicator(Gtk.Window):
-    """Ventana transparente que muestra un círculo animado al hacer click"""
 
-    def __init__(self):
-        super().__init__(type=Gtk.WindowType.POPUP)
-        self.set_app_paintable(True)
-        self.set_decorated(False)
-        self.set_skip_taskbar_hint(True)
-        self.set_skip_pager_hint(True)
-        self.set_keep_above(True)
-        self.set_accept_focus(False)  # No robar foco
-
-        # Hacer click-through
-        self.connect("realize", self._make_click_through)
-
-        # Transparencia
-        screen = self.get_screen()
-        visual = screen.get_rgba_visual()
-        if visual:
-            self.set_visual(visual)
-
-        self.set_default_size(80, 80)
-        self.connect("draw", self.on_draw)
-
-        self.animation_progress = 0
-        self.is_animating = False
-
-    def on_draw(self, widget, cr):
-        # Fondo transparente
-        cr.set_source_rgba(0, 0, 0, 0)
-        cr.set_operator(cairo.OPERATOR_SOURCE)
-        cr.paint()
-        cr.set_operator(cairo.OPERATOR_OVER)
-
-        if self.is_animating:
-            # Centro del círculo
-            cx, cy = 40, 40
-
-            # Círculo exterior (anillo que se expande)
-            progress = self.animation_progress
-            radius = 15 + (25 * progress)
-            alpha = 1.0 - progress
-
-            cr.set_source_rgba(0.59, 0.51, 0.66, alpha * 0.8)  # #9683a9
-            cr.set_line_width(3)
-            cr.arc(cx, cy, radius, 0, 2 * math.pi)
-            cr.stroke()
-
-            # Círculo central (punto de click)
-            cr.set_source_rgba(0.59, 0.51, 0.66, 0.9)
-            cr.arc(cx, cy, 8, 0, 2 * math.pi)
-            cr.fill()
-
-            # Efecto de "presión" - círculo más pequeño
-            if progress < 0.3:
-                inner_alpha = 1.0 - (progress / 0.3)
-                cr.set_source_rgba(1, 1, 1, inner_alpha * 0.6)
-                cr.arc(cx, cy, 5, 0, 2 * math.pi)
-                cr.fill()
-
-        return True
+def match_template(image, template):
+    """NCC de `template` en cada posición válida de `image`.
 
-    def show_at(self, x, y):
-        """Muestra el indicador en la posición especificada y anima"""
-        self.move(x - 40, y - 40)
-        self.animation_progress = 0
-        self.is_animating = True
-        self.show_all()
-        GLib.timeout_add(16, self._animate)  # ~60fps
-
-    def _animate(self):
-        if not self.is_animating:
-            return False
+    Correlación por FFT y normalización con imágenes integrales: el coste
+    no depende del tamaño del template. Retorna None si el template es liso.
+    """
+    H, W = image.shape
+    h, w = template.shape
+    if h > H or w > W:
+        return None
+    t = template.astype(np.float64) - template.mean()
+    t_norm = math.sqrt(float((t * t).sum()))
+    if t_norm < 1e-6:
+        return None
 
-        self.animation_progress += 0.08
-        self.queue_draw()
+    image = image.astype(np.float64)
+    spectrum = np.fft.rfft2(image) * np.conj(np.fft.rfft2(t, image.shape))
+    corr = np.fft.irfft2(spectrum, image.shape)[:H - h + 1, :W - w + 1]
 
-        if self.animation_progress >= 1.0:
-            self.is_animating = False
-            self.hide()
-            return False
+    # Ventanas lisas (varianza < 1 nivel de gris): la NCC no significa nada
+    # y el error de redondeo de las sumas la dispararía, se dejan en 0
+    mean, mean_sq = box_means((image, image * image), h, w)
+    var = mean_sq - mean * mean
+    denom = np.sqrt(np.maximum(var, 1.0) * (h * w)) * t_norm
+    return np.where(var >= 1.0, corr / denom, 0)
 
-        return True
 
-    def _make_click_through(self, widget):
-        """Hace la ventana click-through"""
-        window = self.get_window()
-        if window:
-            region = cairo.Region(cairo.RectangleInt(0, 0, 0, 0))
-            window.input_shape_combine_region(region, 0, 0)
+def locate_snap(snap_b64, x, y, size=LOCATE_SIZE, threshold=LOCATE_THRESHOLD):
+    """Busca el snapshot grabado alrededor de (x, y).
 
+    Retorna (x, y, score) con el centro del mejor match, o None si no hay
+    uno confiable (NCC baja o varios candidatos casi iguales).
+    """
+    if not snap_b64 or not load_pil() or not load_numpy():
+        return None
 
-# ==================== STATUS OVERLAY WINDOW ====================
-
-class StatusOverlay(Gtk.Window):
-    """Ventana flotante que muestra el estado actual de la ejecución"""
+    try:
+        frame = grab_around(x, y, size, size)
+        if not frame:
+            return None
+        template = snap_gray(snap_b64)
+        scores = match_template(frame.gray(), template)
+        if scores is None:
+            return None
+
+        th, tw = template.shape
+        by, bx = np.unravel_index(int(scores.argmax()), scores.shape)
+        best = float(scores[by, bx])
+        if best < threshold:
+            return None
+
+        # Segundo mejor fuera del entorno del pico
+        scores[max(0, by - th // 2):by + th // 2 + 1, max(0, bx - tw // 2):bx + tw // 2 + 1] = -1
+        if scores.size and best - float(scores.max()) < LOCATE_MARGIN:
+            return None
+
+        return frame.x + int(bx) + tw // 2, frame.y + int(by) + th // 2, best
+
+    except Exception:
+        return None
 
-    def __init__(self):
-        super().__init__(type=Gtk.WindowType.POPUP)
-        self.set_decorated(False)
-        self.set_skip_taskbar_hint(True)
-        self.set_skip_pager_hint(True)
-        self.set_accept_focus(False)  # No robar foco
-        self.set_keep_above(True)
-
-        # Hacer click-through (los clicks pasan a través)
-        self.connect("realize", self._make_click_through)
-
-        # Transparencia
-        screen = self.get_screen()
-        visual = screen.get_rgba_visual()
-        if visual:
-            self.set_visual(visual)
-        self.set_app_paintable(True)
-
-        self.connect("draw", self.on_draw_background)
-
-        # Layout principal
-        self.vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
-        self.vbox.set_margin_top(20)
-        self.vbox.set_margin_bottom(20)
-        self.vbox.set_margin_start(25)
-        self.vbox.set_margin_end(25)
-
-        # Icono de estado
-        self.icon_label = Gtk.Label()
-        self.icon_label.set_markup('<span font="32">⚡</span>')
-        self.vbox.pack_start(self.icon_label, False, False, 0)
-
-        # Título del paso actual
-        self.step_label = Gtk.Label()
-        self.step_label.get_style_context().add_class("step-label")
-        self.vbox.pack_start(self.step_label, False, False, 0)
-
-        # Descripción
-        self.desc_label = Gtk.Label()
-        self.desc_label.get_style_context().add_class("step-desc")
-        self.desc_label.set_line_wrap(True)
-        self.desc_label.set_max_width_chars(40)
-        self.vbox.pack_start(self.desc_label, False, False, 0)
-
-        # Área para countdown o typing indicator
-        self.extra_label = Gtk.Label()
-        self.vbox.pack_start(self.extra_label, False, False, 10)
-
-        # Progress bar
-        self.progress = Gtk.ProgressBar()
-        self.progress.set_size_request(250, 8)
-        self.vbox.pack_start(self.progress, False, False, 5)
-
-        self.add(self.vbox)
-
-        # Estado
-        self.countdown_remaining = 0
-        self.typing_text = ""
-        self.typing_index = 0
-
-    def on_draw_background(self, widget, cr):
-        """Dibuja fondo con bordes redondeados"""
-        width = widget.get_allocated_width()
-        height = widget.get_allocated_height()
-        radius = 15
-
-        # Fondo semi-transparente con bordes redondeados
-        cr.set_source_rgba(0.1, 0.1, 0.1, 0.92)
-
-        # Dibujar rectángulo redondeado
-        cr.move_to(radius, 0)
-        cr.line_to(width - radius, 0)
-        cr.arc(width - radius, radius, radius, -math.pi/2, 0)
-        cr.line_to(width, height - radius)
-        cr.arc(width - radius, height - radius, radius, 0, math.pi/2)
-        cr.line_to(radius, height)
-        cr.arc(radius, height - radius, radius, math.pi/2, math.pi)
-        cr.line_to(0, radius)
-        cr.arc(radius, radius, radius, math.pi, 3*math.pi/2)
-        cr.close_path()
-        cr.fill()
-
-        # Borde
-        cr.set_source_rgba(0.59, 0.51, 0.66, 0.8)  # #9683a9
-        cr.set_line_width(2)
-        cr.move_to(radius, 0)
-        cr.line_to(width - radius, 0)
-        cr.arc(width - radius, radius, radius, -math.pi/2, 0)
-        cr.line_to(width, height - radius)
-        cr.arc(width - radius, height - radius, radius, 0, math.pi/2)
-        cr.line_to(radius, height)
-        cr.arc(radius, height - radius, radius, math.pi/2, math.pi)
-        cr.line_to(0, radius)
-        cr.arc(radius, radius, radius, math.pi, 3*math.pi/2)
-        cr.close_path()
-        cr.stroke()
-
-        return False
-
-    def _make_click_through(self, widget):
-        """Hace la ventana click-through (los eventos pasan a través)"""
-        window = self.get_window()
-        if window:
-            # Crear región vacía para input - clicks pasan a través
-            region = cairo.Region(cairo.RectangleInt(0, 0, 0, 0))
-            window.input_shape_combine_region(region, 0, 0)
-
-    def position_on_screen(self):
-        """Posiciona la ventana en la esquina superior derecha"""
-        display = Gdk.Display.get_default()
-        monitor = display.get_primary_monitor()
-        geometry = monitor.get_geometry()
-
-        # Calcular tamaño necesario
-        self.set_default_size(300, 180)
-
-        # Posicionar en esquina superior derecha con margen
-        x = geometry.x + geometry.width - 320
-        y = geometry.y + 20
-        self.move(x, y)
-
-    def show_step(self, icon, title, description, current, total):
-        """Muestra información del paso actual"""
-        self.icon_label.set_markup(f'<span font="32">{icon}</span>')
-        self.step_label.set_markup(f'<span color="#9683a9">{title}</span>')
-        self.desc_label.set_text(description)
-        self.extra_label.set_text("")
-
-        # Actualizar progreso
-        progress = current / total if total > 0 else 0
-        self.progress.set_fraction(progress)
-
-        self.position_on_screen()
-        self.show_all()
-
-        # Procesar eventos GTK
-        while Gtk.events_pending():
-            Gtk.main_iteration()
-
-    def show_countdown(self, seconds):
-        """Muestra countdown animado"""
-        self.countdown_remaining = seconds
-        self._update_countdown()
-
-    def _update_countdown(self):
-        if self.countdown_remaining <= 0:
-            return False
 
-        self.extra_label.set_markup(
-            f'<span font="48" color="#9683a9">{self.countdown_remaining:.1f}</span>'
-        )
+def compare_frame(snap_b64, frame, threshold=None, metric=None):
+    """Compara una captura guardada con una región ya capturada. True si son similares.
 
-        # Procesar eventos GTK
-        while Gtk.events_pending():
-            Gtk.main_iteration()
+    Sin NumPy usa la diferencia media con PIL (la métrica "mad").
+    """
+    metric = metric or SNAP_METRIC
+    if metric not in SNAP_METRICS or not load_numpy():
+        metric = "mad"
+    if threshold is None:
+        threshold = SNAP_THRESHOLDS[metric]
 
-        return True
+    try:
+        if HAS_NUMPY:
+            return snap_similarity(snap_b64, frame, metric) >= threshold
 
-    def show_typing(self, text, is_password=False):
-        """Muestra indicador de escritura"""
-        if is_password:
-            display = "●" * len(text)
-        else:
-            # Mostrar texto truncado si es muy largo
-            display = text[:25] + "..." if len(text) > 25 else text
+        saved_img = decode_snap(snap_b64)
+        current_img = frame.image()
 
-        self.extra_label.set_markup(
-            f'<span font="16" font_family="monospace" color="#9683a9">{display}</span>'
-        )
+        # Asegurar mismo tamaño
+        if saved_img.size != current_img.size:
+            current_img = current_img.resize(saved_img.size)
 
-        while Gtk.events_pending():
-            Gtk.main_iteration()
+        # Diferencia en escala de grises; el histograma evita recorrer píxeles en Python
+        diff = ImageChops.difference(saved_img.convert('L'), current_img.convert('L'))
+        hist = diff.histogram()
+        total_diff = sum(value * count for value, count in enumerate(hist))
+        similarity = 1 - total_diff / (255 * diff.width * diff.height)
 
+        return similarity >= threshold
 
-# ==================== MAIN APP ====================
+    except Exception as e:
+        return True  # En caso de error, continuar
 
-class TurlsApp(Gtk.Window):
-    def __init__(self):
-        super().__init__(title="TURLS")
-        self.set_default_size(550, 400)
-        self.set_decorated(False)
-        self.set_position(Gtk.WindowPosition.CENTER)
-        self.set_keep_above(True)
-
-        self.recording = None
-        self.edit_path = None
-
-        # Componentes de visualización
-        self.click_indicator = ClickIndicator()
-        self.status_overlay = StatusOverlay()
-
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_data(CSS.encode())
-        Gtk.StyleContext.add_provider_for_screen(
-            Gdk.Screen.get_default(),
-            css_provider,
-            Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-        )
 
-        self.connect("key-press-event", self.on_key)
-        self.show_main()
+# ==================== HASH PERCEPTUAL ====================
+
+# dHash de 128 bits (gradientes horizontales y verticales de una miniatura
+# de 9x9) guardado como "snap_hash" al grabar. Al reproducir, la distancia
+# de Hamming decide sola en los extremos y la comparación completa (que
+# decodifica el PNG) solo corre en la banda intermedia.
+#
+# Un bit solo vale 1 si el gradiente supera HASH_MARGIN: en las zonas lisas
+# el signo de una diferencia de 0-1 niveles lo decide el ruido de captura, y
+# sin margen el mismo botón quedaba a 12-20 bits (mediana). Con él, en páginas
+# sintéticas de densas a casi vacías, el mismo elemento (tal cual, con hover
+# o con ruido) queda a 0-4 bits, y dos regiones distintas a 4 o menos solo en
+# el 0.1-0.7% de los pares de las páginas ralas (recortes con la misma palabra
+# sobre blanco). Subir HASH_ACCEPT a 8 lo lleva al 1-3%: el corte se queda en
+# 4. Un corrimiento de 1 px (4-8 bits) cae en la banda y lo decide la
+# comparación completa. Los pasos con "snap_metric" o "snap_threshold" propios
+# no usan el hash: su umbral manda.
+HASH_ACCEPT = 4          # Bits distintos hasta los que se acepta sin más
+HASH_REJECT = 40         # Bits distintos desde los que se rechaza sin más
+HASH_MARGIN = 2          # Gradiente mínimo (niveles de gris) para un bit 1
+HASH_MIN_CONTRAST = 12   # Miniaturas casi lisas no tienen hash fiable
+
+
+def perceptual_hash(frame):
+    """dHash de la región en hexadecimal, o None si es demasiado lisa"""
+    thumb = frame.image().convert("L").resize((9, 9), Image.BOX)
+    pixels = list(thumb.getdata())
+    if max(pixels) - min(pixels) < HASH_MIN_CONTRAST:
+        return None
 
-    def on_key(self, w, event):
-        if event.keyval == Gdk.KEY_Escape:
-            Gtk.main_quit()
-        return False
+    bits = 0
+    for r in range(8):
+        for c in range(8):
+            bits = (bits << 1) | (pixels[r * 9 + c] > pixels[r * 9 + c + 1] + HASH_MARGIN)
+    for r in range(8):
+        for c in range(8):
+            bits = (bits << 1) | (pixels[r * 9 + c] > pixels[(r + 1) * 9 + c] + HASH_MARGIN)
+    return f"{bits:032x}"
+
+
+def hash_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def check_snap(snap_b64, frame, snap_hash=None, threshold=None, metric=None):
+    """Verifica el snapshot: hash perceptual primero, comparación completa si hay duda.
+
+    Un paso típico (el mismo botón, con ruido de captura) se decide por hash
+    sin decodificar el PNG guardado (python3 -m doctest turls.py):
+
+    >>> import random
+    >>> from PIL import Image, ImageDraw
+    >>> _ = load_pil()
+    >>> img = Image.new("RGB", (60, 60), "white")
+    >>> draw = ImageDraw.Draw(img)
+    >>> draw.rounded_rectangle([4, 18, 56, 42], 5, fill=(66, 133, 244))
+    >>> draw.text((12, 24), "Enviar", fill="white")
+    >>> saved = Frame(60, 60, img.tobytes(), "RGB")
+    >>> rng = random.Random(0)
+    >>> noisy = bytes(max(0, min(255, round(b + rng.gauss(0, 4)))) for b in img.tobytes())
+    >>> live = Frame(60, 60, noisy, "RGB")
+    >>> hash_distance(perceptual_hash(saved), perceptual_hash(live)) <= HASH_ACCEPT
+    True
+    >>> check_snap(encode_snap(saved), live, perceptual_hash(saved))
+    True
+    >>> decode_snap.cache_info().misses
+    0
+    """
+    if snap_hash:
+        current = perceptual_hash(frame)
+        if current:
+            distance = hash_distance(snap_hash, current)
+            if distance <= HASH_ACCEPT:
+                return True
+            if distance >= HASH_REJECT:
+                return False
+    return compare_frame(snap_b64, frame, threshold, metric)
+
+
+# ==================== VERIFICACIÓN DE CLICKS ====================
+
+VERIFY_WORKERS = 3  # OCR, color y snapshot en paralelo
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=VERIFY_WORKERS,
+                                   thread_name_prefix="turls-verify")
+    return _pool
+
+
+def verify_click(x, y, props, snap=None, threshold=None, metric=None, snap_hash=None):
+    """Verifica un click con una sola captura de pantalla.
+
+    Captura una región que cubre la de propiedades (120x60) y la del
+    snapshot, y lanza OCR, color y comparación del snapshot en paralelo
+    sobre el mismo buffer: el tiempo total es el de la comprobación más
+    lenta. Con `snap_hash` los casos claros se resuelven por hash,
+    sin decodificar el PNG guardado. Retorna (props_ok, mismatches,
+    snap_ok): mismatches es la lista de diferencias de props (o None) y
+    ante cualquier error se da por válido, para no frenar la ejecución.
+    """
+    props = props or {}
+    if not load_pil() or not (props or snap):
+        return True, None, True
+    if threshold is not None or metric is not None:
+        snap_hash = None  # El paso fijó su propio criterio: el hash no lo reemplaza
+
+    snap_size = (0, 0)
+    if snap and snap_hash:
+        snap_size = (SNAP_SIZE, SNAP_SIZE)  # El hash se grabó sobre la región estándar
+    elif snap:
+        try:
+            snap_size = decode_snap(snap).size
+        except Exception:
+            snap = None
+    props_size = PROPS_SIZE if props else (0, 0)
+
+    frame = grab_around(x, y, max(props_size[0], snap_size[0]), max(props_size[1], snap_size[1]))
+    if not frame:
+        return True, None, True  # No se pudo capturar, continuar
+
+    pool = get_pool()
+    futures = {}
+    if props:
+        props_frame = frame.crop_around(x, y, *PROPS_SIZE)
+        if props.get("text"):
+            futures["text"] = pool.submit(element_text, props_frame)
+        if props.get("color"):
+            futures["color"] = pool.submit(element_color, props_frame)
+    if snap:
+        futures["snap"] = pool.submit(check_snap, snap, frame.crop_around(x, y, *snap_size),
+                                      snap_hash, threshold, metric)
+
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception:
+            results[name] = None
 
-    def clear(self):
-        for c in self.get_children():
-            self.remove(c)
+    current = {k: results[k] for k in ("text", "color") if results.get(k)}
+    mismatches = props_mismatches(props, current)
+    snap_ok = results.get("snap") is not False
+    return not mismatches, mismatches or None, snap_ok
 
-    # ==================== PANTALLA PRINCIPAL ====================
 
-    def show_main(self):
-        self.clear()
-        self.edit_path = None
+# ==================== CATÁLOGO ====================
 
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
+# ruta -> (mtime, datos). En modo residente evita releer y parsear cada
+# JSON (con sus snapshots en base64) cada vez que se abre la lista
+_catalog = {}
 
-        turls = self.get_turls()
 
-        if turls:
-            lbl_info = Gtk.Label(label="Click para ejecutar", xalign=0)
-            lbl_info.get_style_context().add_class("info")
-            vbox.pack_start(lbl_info, False, False, 0)
+def load_turl(path):
+    """Carga un workflow, reutilizando la copia en memoria si el archivo no cambió"""
+    path = str(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _catalog.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    data = json.loads(Path(path).read_text())
+    _catalog[path] = (mtime, data)
+    return data
 
-            listbox = Gtk.ListBox()
-            listbox.set_selection_mode(Gtk.SelectionMode.SINGLE)
 
-            for name, path in turls:
-                row = Gtk.ListBoxRow()
-                row.path = path
+def list_turls():
+    """Retorna [(nombre, ruta)] de los workflows guardados"""
+    result = []
+    paths = sorted(str(f) for f in SAVED_DIR.glob("*.json"))
+    for path in paths:
+        try:
+            result.append((load_turl(path)["name"], path))
+        except:
+            pass
+    for path in set(_catalog) - set(paths):
+        _catalog.pop(path, None)  # Borrados o archivados
+    return result
+
+
+def find_turl(name):
+    """Busca un workflow por nombre, nombre de archivo (sin .json) o ruta"""
+    path = Path(name).expanduser()
+    if path.suffix == ".json" and path.is_file():
+        return str(path)
+    for turl_name, turl_path in list_turls():
+        if name in (turl_name, Path(turl_path).stem):
+            return turl_path
+    return None
 
-                hbox_row = Gtk.Box(spacing=8)
 
-                # Nombre del workflow
-                lbl = Gtk.Label(label=name, xalign=0)
-                hbox_row.pack_start(lbl, True, True, 0)
+# ==================== ENTRADA (MOUSE/TECLADO) ====================
 
-                # Botón archivar (icono) - va segundo
-                btn_archive = Gtk.Button(label="📦")
-                btn_archive.set_relief(Gtk.ReliefStyle.NONE)
-                btn_archive.get_style_context().add_class("icon-btn")
-                btn_archive.connect("clicked", lambda x, p=path: self.on_archive_clicked(p))
-                hbox_row.pack_end(btn_archive, False, False, 0)
+SCROLL_DELAY = 0.05  # Pausa entre pasos de rueda
+TYPE_DELAY = 0.005   # Pausa entre teclas al escribir con XTEST
 
-                # Botón editar (icono) - va primero
-                btn_edit = Gtk.Button(label="✏")
-                btn_edit.set_relief(Gtk.ReliefStyle.NONE)
-                btn_edit.get_style_context().add_class("icon-btn")
-                btn_edit.connect("clicked", lambda x, p=path: self.on_edit_clicked(p))
-                hbox_row.pack_end(btn_edit, False, False, 0)
+# Nombres de modificador aceptados en pasos "key" (ctrl+a, ctrl+Return...)
+MODIFIER_KEYS = {
+    "ctrl": "Control_L",
+    "control": "Control_L",
+    "shift": "Shift_L",
+    "alt": "Alt_L",
+    "super": "Super_L",
+    "meta": "Meta_L",
+}
 
-                row.add(hbox_row)
-                row.connect("activate", lambda r: self.run_turl(r.path))
-                listbox.add(row)
+class XdotoolInput:
+    """Entrada con xdotool: un proceso por acción (fallback sin python-xlib)"""
 
-            listbox.connect("row-activated", self.on_run)
+    name = "xdotool"
 
-            scroll = Gtk.ScrolledWindow()
-            scroll.set_min_content_height(250)
-            scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-            scroll.add(listbox)
-            vbox.pack_start(scroll, True, True, 0)
-        else:
-            lbl = Gtk.Label(label="No hay URLs guardadas")
-            vbox.pack_start(lbl, True, True, 20)
+    def screen_size(self):
+        return get_screen_size()
 
-        # Botón nuevo (más pequeño)
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
-
-        btn_new = Gtk.Button(label="Nuevo")
-        btn_new.get_style_context().add_class("small-btn")
-        btn_new.connect("clicked", lambda x: self.show_new())
-        hbox.pack_start(btn_new, False, False, 0)
-
-        vbox.pack_end(hbox, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
+    def active_window(self):
+        result = subprocess.run(["xdotool", "getactivewindow"],
+                                capture_output=True, text=True)
+        return result.stdout.strip() or None
 
-    def on_edit_clicked(self, path):
-        """Editar workflow directamente"""
-        self.show_edit_steps(path)
+    def activate(self, window):
+        subprocess.run(["xdotool", "windowactivate", "--sync", str(window)],
+                       capture_output=True)
 
-    def on_archive_clicked(self, path):
-        """Archivar workflow (mover a carpeta archive)"""
-        archive_dir = SAVED_DIR / "archive"
-        archive_dir.mkdir(exist_ok=True)
-        src = Path(path)
-        dst = archive_dir / src.name
-        src.rename(dst)
-        self.show_main()
-
-    def get_turls(self):
-        result = []
-        for f in sorted(SAVED_DIR.glob("*.json")):
-            try:
-                data = json.loads(f.read_text())
-                result.append((data["name"], str(f)))
-            except:
-                pass
-        return result
-
-    def on_run(self, listbox, row):
-        self.run_turl(row.path)
-
-    # ==================== NUEVA URL ====================
-
-    def show_new(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl_title = Gtk.Label(label="Nueva URL")
-        lbl_title.get_style_context().add_class("title")
-        vbox.pack_start(lbl_title, False, False, 0)
-
-        # Nombre
-        lbl1 = Gtk.Label(label="Nombre:", xalign=0)
-        vbox.pack_start(lbl1, False, False, 0)
-
-        self.entry_name = Gtk.Entry()
-        self.entry_name.set_placeholder_text("Ej: Buscar en Google")
-        vbox.pack_start(self.entry_name, False, False, 0)
-
-        # URL
-        lbl2 = Gtk.Label(label="URL inicial:", xalign=0)
-        vbox.pack_start(lbl2, False, False, 0)
-
-        self.entry_url = Gtk.Entry()
-        self.entry_url.set_placeholder_text("https://google.com")
-        vbox.pack_start(self.entry_url, False, False, 0)
-
-        # Botones
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
-
-        btn_cancel = Gtk.Button(label="Cancelar")
-        btn_cancel.connect("clicked", lambda x: self.show_main())
-        hbox.pack_start(btn_cancel, False, False, 0)
-
-        btn_next = Gtk.Button(label="Crear y grabar")
-        btn_next.connect("clicked", self.start_recording)
-        hbox.pack_start(btn_next, False, False, 0)
-
-        vbox.pack_end(hbox, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-        self.entry_name.grab_focus()
-
-    def start_recording(self, btn):
-        name = self.entry_name.get_text().strip()
-        url = self.entry_url.get_text().strip()
-
-        if not name or not url:
-            return
+    def move(self, x, y):
+        subprocess.run(["xdotool", "mousemove", "--sync", str(x), str(y)])
 
-        if not url.startswith("http"):
-            url = "https://" + url
+    def click(self, button=1, repeat=1, delay=SCROLL_DELAY):
+        subprocess.run(["xdotool", "click", "--repeat", str(repeat),
+                        "--delay", str(int(delay * 1000)), str(button)])
 
-        self.edit_path = None
-        self.recording = {
-            "name": name,
-            "created": str(date.today()),
-            "steps": [{"type": "url", "value": url}]
-        }
+    def key(self, combo):
+        subprocess.run(["xdotool", "key", "--clearmodifiers", combo])
 
-        # Abrir URL
-        subprocess.Popen(["xdg-open", url])
+    def type(self, text):
+        subprocess.run(["xdotool", "type", "--clearmodifiers", text])
 
-        # Esperar a que cargue y mostrar panel de grabación
-        GLib.timeout_add(2000, self.show_recording_panel)
-
-    # ==================== PANEL DE GRABACIÓN ====================
-
-    def show_recording_panel(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        # Título
-        name = self.recording["name"]
-        lbl_title = Gtk.Label(label=f"Grabando: {name}")
-        lbl_title.get_style_context().add_class("title")
-        vbox.pack_start(lbl_title, False, False, 0)
-
-        # Contador de pasos
-        n_steps = len(self.recording["steps"])
-        self.lbl_steps = Gtk.Label(label=f"Pasos grabados: {n_steps}")
-        self.lbl_steps.get_style_context().add_class("info")
-        vbox.pack_start(self.lbl_steps, False, False, 5)
-
-        # Instrucciones
-        lbl_info = Gtk.Label(label="Selecciona qué grabar:")
-        vbox.pack_start(lbl_info, False, False, 10)
-
-        # Botones de acción
-        btn_click = Gtk.Button(label="Grabar CLICK")
-        btn_click.connect("clicked", lambda x: self.record_click())
-        vbox.pack_start(btn_click, False, False, 0)
-
-        btn_text = Gtk.Button(label="Grabar TEXTO")
-        btn_text.connect("clicked", lambda x: self.show_text_options())
-        vbox.pack_start(btn_text, False, False, 0)
-
-        btn_key = Gtk.Button(label="Grabar TECLA")
-        btn_key.connect("clicked", lambda x: self.show_key_options())
-        vbox.pack_start(btn_key, False, False, 0)
-
-        btn_scroll = Gtk.Button(label="Grabar SCROLL")
-        btn_scroll.connect("clicked", lambda x: self.show_scroll_options())
-        vbox.pack_start(btn_scroll, False, False, 0)
-
-        btn_wait = Gtk.Button(label="Agregar ESPERA")
-        btn_wait.connect("clicked", lambda x: self.show_wait_dialog())
-        vbox.pack_start(btn_wait, False, False, 0)
-
-        # Separador
-        vbox.pack_start(Gtk.Separator(), False, False, 10)
-
-        # Botones finales
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
-
-        btn_cancel = Gtk.Button(label="Cancelar")
-        btn_cancel.connect("clicked", lambda x: self.show_main())
-        hbox.pack_start(btn_cancel, False, False, 0)
-
-        btn_save = Gtk.Button(label="GUARDAR")
-        btn_save.connect("clicked", self.save_recording)
-        hbox.pack_start(btn_save, False, False, 0)
-
-        vbox.pack_end(hbox, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-        return False
-
-    def update_step_count(self):
-        n = len(self.recording["steps"])
-        self.lbl_steps.set_text(f"Pasos grabados: {n}")
-
-    # ==================== GRABAR CLICK ====================
-
-    def record_click(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        vbox.set_valign(Gtk.Align.CENTER)
-        vbox.set_halign(Gtk.Align.CENTER)
-
-        lbl = Gtk.Label(label="HAZ CLICK donde quieras")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 10)
-
-        lbl2 = Gtk.Label(label="(en el navegador)")
-        lbl2.get_style_context().add_class("info")
-        vbox.pack_start(lbl2, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-
-        # Esperar click en hilo separado
-        thread = threading.Thread(target=self._wait_and_record_click)
-        thread.daemon = True
-        thread.start()
-
-    def _wait_and_record_click(self):
-        x, y = wait_for_click()
-        if x is not None:
-            # Convertir a porcentajes para adaptarse a cambios de resolución
-            px, py = coords_to_percent(x, y)
-            # Capturar snapshot de la región para verificación
-            snap = capture_region(x, y)
-            # Detectar propiedades del elemento (texto, color)
-            props = detect_element_properties(x, y)
-
-            step = {
-                "type": "click",
-                "x": x,  # Absoluto (legacy/referencia)
-                "y": y,
-                "px": px,  # Porcentaje
-                "py": py
-            }
-            if snap:
-                step["snap"] = snap
-            if props:
-                step["props"] = props
-
-            self.recording["steps"].append(step)
-            GLib.idle_add(self.show_recording_panel)
-
-    # ==================== GRABAR TEXTO ====================
-
-    def show_text_options(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Tipo de texto")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 0)
-
-        btn_var = Gtk.Button(label="Pedir al ejecutar")
-        btn_var.connect("clicked", lambda x: self.show_text_prompt_dialog())
-        vbox.pack_start(btn_var, False, False, 0)
 
-        lbl_var = Gtk.Label(label="Te preguntará qué escribir cada vez")
-        lbl_var.get_style_context().add_class("info")
-        vbox.pack_start(lbl_var, False, False, 0)
+class XTestInput:
+    """Entrada en proceso con XTEST sobre una única conexión X persistente.
 
-        btn_fixed = Gtk.Button(label="Texto fijo")
-        btn_fixed.connect("clicked", lambda x: self.show_text_fixed_dialog())
-        vbox.pack_start(btn_fixed, False, False, 0)
+    Cada acción es una petición al servidor en vez de un fork de xdotool.
+    Los caracteres sin tecla en el layout actual se escriben remapeando
+    temporalmente un keycode libre, como hace `xdotool type`.
+    """
 
-        lbl_fixed = Gtk.Label(label="Siempre escribirá lo mismo")
-        lbl_fixed.get_style_context().add_class("info")
-        vbox.pack_start(lbl_fixed, False, False, 0)
+    name = "xtest"
 
-        btn_pass = Gtk.Button(label="Contraseña (seguro)")
-        btn_pass.connect("clicked", lambda x: self.show_password_dialog())
-        vbox.pack_start(btn_pass, False, False, 0)
+    def __init__(self):
+        if not load_xlib():
+            raise ImportError("python-xlib no está instalado")
+        self.display = xdisplay.Display()
+        if not self.display.has_extension("XTEST"):
+            self.display.close()
+            raise OSError("el servidor X no tiene la extensión XTEST")
+        self.root = self.display.screen().root
+        self.net_active_window = self.display.intern_atom("_NET_ACTIVE_WINDOW")
+        self.spare_keycode = self._find_spare_keycode()
+        self.spare_mapped = False
+
+    def screen_size(self):
+        geometry = self.root.get_geometry()
+        return geometry.width, geometry.height
+
+    def active_window(self):
+        prop = self.root.get_full_property(self.net_active_window, X.AnyPropertyType)
+        if prop and len(prop.value) and prop.value[0]:
+            return int(prop.value[0])
+        return None
 
-        lbl_pass = Gtk.Label(label="Pide al ejecutar, NO se guarda")
-        lbl_pass.get_style_context().add_class("info")
-        vbox.pack_start(lbl_pass, False, False, 0)
+    def activate(self, window, timeout=1.0):
+        """Equivalente a `xdotool windowactivate --sync`"""
+        window = int(window)
+        ev = xevent.ClientMessage(
+            window=self.display.create_resource_object("window", window),
+            client_type=self.net_active_window,
+            data=(32, [2, X.CurrentTime, 0, 0, 0])
+        )
+        self.root.send_event(ev, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+        self.display.flush()
+
+        deadline = time.monotonic() + timeout
+        while self.active_window() != window and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def move(self, x, y):
+        self.display.xtest_fake_input(X.MotionNotify, x=x, y=y)
+        self.display.sync()
+
+    def click(self, button=1, repeat=1, delay=SCROLL_DELAY):
+        for i in range(repeat):
+            if i:
+                time.sleep(delay)
+            self.display.xtest_fake_input(X.ButtonPress, button)
+            self.display.xtest_fake_input(X.ButtonRelease, button)
+            self.display.sync()
+
+    def key(self, combo):
+        *mods, name = combo.split("+")
+        keycodes = [self._lookup(XK.string_to_keysym(MODIFIER_KEYS.get(m.lower(), m)))[0]
+                    for m in mods]
+        keycode, shift = self._lookup(XK.string_to_keysym(name))
+        if shift:
+            keycodes.append(self._lookup(XK.XK_Shift_L)[0])
+
+        self._release_modifiers()
+        self._press(keycodes + [keycode])
+        self._restore_spare()
+
+    def type(self, text):
+        self._release_modifiers()
+        shift_keycode = self._lookup(XK.XK_Shift_L)[0]
+        for ch in text:
+            keycode, shift = self._lookup(char_keysym(ch))
+            self._press([shift_keycode, keycode] if shift else [keycode])
+            time.sleep(TYPE_DELAY)
+        self._restore_spare()
+
+    def _press(self, keycodes):
+        """Pulsa las teclas en orden y las suelta en orden inverso"""
+        keycodes = [k for k in keycodes if k]
+        for keycode in keycodes:
+            self.display.xtest_fake_input(X.KeyPress, keycode)
+        for keycode in reversed(keycodes):
+            self.display.xtest_fake_input(X.KeyRelease, keycode)
+        self.display.sync()
+
+    def _lookup(self, keysym):
+        """Retorna (keycode, necesita_shift) para un keysym, remapeando si hace falta"""
+        self._refresh_keymap()
+        if not keysym:
+            return 0, False
+        for keycode, index in self.display.keysym_to_keycodes(keysym):
+            if index in (0, 1):
+                return keycode, index == 1
+        if not self.spare_keycode:
+            return 0, False
+        self.display.change_keyboard_mapping(self.spare_keycode, [(keysym, keysym)])
+        self.display.sync()
+        self.spare_mapped = True
+        return self.spare_keycode, False
+
+    def _refresh_keymap(self):
+        """Aplica los MappingNotify pendientes (cambio de layout, remapeos propios)"""
+        while self.display.pending_events():
+            ev = self.display.next_event()
+            if ev.type == X.MappingNotify:
+                self.display.refresh_keyboard_mapping(ev)
+
+    def _find_spare_keycode(self):
+        """Busca un keycode sin keysyms para escribir caracteres fuera del layout"""
+        info = self.display.display.info
+        count = info.max_keycode - info.min_keycode + 1
+        mapping = self.display.get_keyboard_mapping(info.min_keycode, count)
+        for i in range(count - 1, -1, -1):
+            if not any(mapping[i]):
+                return info.min_keycode + i
+        return None
 
-        btn_back = Gtk.Button(label="Volver")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        vbox.pack_end(btn_back, False, False, 10)
-
-        self.add(vbox)
-        self.show_all()
-
-    def show_text_prompt_dialog(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="¿Qué pregunta mostrar?")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 0)
-
-        self.entry_prompt = Gtk.Entry()
-        self.entry_prompt.set_placeholder_text("Ej: ¿Qué quieres buscar?")
-        vbox.pack_start(self.entry_prompt, False, False, 0)
-
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
-
-        btn_back = Gtk.Button(label="Cancelar")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        hbox.pack_start(btn_back, False, False, 0)
-
-        btn_ok = Gtk.Button(label="Agregar")
-        btn_ok.connect("clicked", self.add_text_prompt)
-        hbox.pack_start(btn_ok, False, False, 0)
-
-        vbox.pack_end(hbox, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-
-    def add_text_prompt(self, btn):
-        prompt = self.entry_prompt.get_text().strip() or "Escribe texto"
-        self.recording["steps"].append({
-            "type": "input",
-            "prompt": prompt
-        })
-        self.show_recording_panel()
+    def _restore_spare(self):
+        if self.spare_mapped:
+            self.display.change_keyboard_mapping(self.spare_keycode, [(X.NoSymbol, X.NoSymbol)])
+            self.display.sync()
+            self.spare_mapped = False
+
+    def _release_modifiers(self):
+        """Como --clearmodifiers: suelta los modificadores que siguen pulsados
+        (típicamente los del atajo que lanzó el workflow). No se vuelven a
+        pulsar después para no dejar teclas trabadas si ya se soltaron."""
+        keymap = self.display.query_keymap()
+        held = [keycode
+                for keycodes in self.display.get_modifier_mapping()
+                for keycode in keycodes
+                if keycode and keymap[keycode // 8] & (1 << (keycode % 8))]
+        for keycode in held:
+            self.display.xtest_fake_input(X.KeyRelease, keycode)
+        if held:
+            self.display.sync()
+
+
+def char_keysym(ch):
+    """Keysym de un carácter: Latin-1 coincide con el código, el resto es Unicode"""
+    if ch == "\n":
+        return XK.XK_Return
+    if ch == "\t":
+        return XK.XK_Tab
+    code = ord(ch)
+    if 0x20 <= code <= 0x7e or 0xa0 <= code <= 0xff:
+        return code
+    return 0x01000000 | code
+
+
+INPUT_BACKENDS = ("auto", "xtest", "xdotool")
+
+
+def make_input(backend="auto"):
+    """Crea el backend de entrada: "xtest", "xdotool" o "auto" (xtest si se puede)"""
+    if backend in ("auto", "xtest"):
+        try:
+            return XTestInput()
+        except Exception as e:  # Sin python-xlib, sin DISPLAY o sin XTEST
+            if backend == "xtest":
+                print(f"XTEST no disponible ({e}), usando xdotool", file=sys.stderr)
+    return XdotoolInput()
+
+
+# ==================== EJECUCIÓN ====================
+
+KEY_DISPLAY = {
+    "Return": "Enter ↵",
+    "Tab": "Tab ⇥",
+    "Escape": "Escape",
+    "BackSpace": "Borrar ⌫",
+    "space": "Espacio",
+    "ctrl+a": "Ctrl+A",
+    "ctrl+c": "Ctrl+C",
+    "ctrl+v": "Ctrl+V",
+}
 
-    def show_text_fixed_dialog(self):
-        self.clear()
 
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
+def rofi_input(prompt, password=False):
+    """Pide un texto con rofi. Retorna None si se cancela."""
+    cmd = ["rofi", "-dmenu", "-p", prompt, "-lines", "0", "-normal-window"]
+    if ROFI_THEME.exists():
+        cmd += ["-theme", str(ROFI_THEME)]
+    if password:
+        cmd.append("-password")
+    result = subprocess.run(cmd, input="", capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return result.stdout.rstrip("\n")
 
-        lbl = Gtk.Label(label="Texto a escribir:")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 0)
 
-        self.entry_fixed = Gtk.Entry()
-        vbox.pack_start(self.entry_fixed, False, False, 0)
+def rofi_confirm(prompt, message):
+    """Pregunta Sí/No con rofi. Retorna True si se elige continuar."""
+    cmd = ["rofi", "-dmenu", "-i", "-p", prompt, "-mesg", message, "-normal-window"]
+    if ROFI_THEME.exists():
+        cmd += ["-theme", str(ROFI_THEME)]
+    result = subprocess.run(cmd, input="Continuar\nCancelar\n",
+                            capture_output=True, text=True)
+    return result.stdout.strip() == "Continuar"
 
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
 
-        btn_back = Gtk.Button(label="Cancelar")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        hbox.pack_start(btn_back, False, False, 0)
+class HeadlessUI:
+    """Interfaz de ejecución sin GTK: progreso a stderr y diálogos con rofi.
 
-        btn_ok = Gtk.Button(label="Agregar")
-        btn_ok.connect("clicked", self.add_text_fixed)
-        hbox.pack_start(btn_ok, False, False, 0)
+    Runner solo habla con la interfaz a través de estos métodos; OverlayUI
+    los reimplementa con el overlay de estado y los diálogos GTK.
+    """
 
-        vbox.pack_end(hbox, False, False, 0)
+    def step(self, icon, title, description, current, total):
+        print(f"[{current}/{total}] {title}: {description}", file=sys.stderr)
 
-        self.add(vbox)
-        self.show_all()
+    def wait(self, seconds):
+        """Espera larga (carga de página, paso wait)"""
+        time.sleep(seconds)
 
-    def add_text_fixed(self, btn):
-        text = self.entry_fixed.get_text()
-        if text:
-            self.recording["steps"].append({
-                "type": "input",
-                "value": text
-            })
-        self.show_recording_panel()
-
-    def show_password_dialog(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Etiqueta para la contraseña")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 0)
-
-        lbl2 = Gtk.Label(label="Ej: 'Contraseña de Gmail'")
-        lbl2.get_style_context().add_class("info")
-        vbox.pack_start(lbl2, False, False, 0)
-
-        self.entry_pass_label = Gtk.Entry()
-        self.entry_pass_label.set_placeholder_text("Contraseña")
-        vbox.pack_start(self.entry_pass_label, False, False, 0)
-
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
-
-        btn_back = Gtk.Button(label="Cancelar")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        hbox.pack_start(btn_back, False, False, 0)
-
-        btn_ok = Gtk.Button(label="Agregar")
-        btn_ok.connect("clicked", self.add_password)
-        hbox.pack_start(btn_ok, False, False, 0)
-
-        vbox.pack_end(hbox, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-
-    def add_password(self, btn):
-        label = self.entry_pass_label.get_text().strip() or "Contraseña"
-        self.recording["steps"].append({
-            "type": "password",
-            "prompt": label
-        })
-        self.show_recording_panel()
-
-    # ==================== GRABAR TECLA ====================
-
-    def show_key_options(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Selecciona tecla")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 5)
-
-        keys = [
-            ("Enter", "Return"),
-            ("Tab", "Tab"),
-            ("Escape", "Escape"),
-            ("Borrar", "BackSpace"),
-            ("Espacio", "space"),
-            ("Ctrl+A (Seleccionar todo)", "ctrl+a"),
-            ("Ctrl+C (Copiar)", "ctrl+c"),
-            ("Ctrl+V (Pegar)", "ctrl+v"),
-        ]
-
-        for label, key in keys:
-            btn = Gtk.Button(label=label)
-            btn.connect("clicked", lambda x, k=key: self.add_key(k))
-            vbox.pack_start(btn, False, False, 0)
-
-        btn_back = Gtk.Button(label="Volver")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        vbox.pack_end(btn_back, False, False, 10)
-
-        self.add(vbox)
-        self.show_all()
-
-    def add_key(self, key):
-        self.recording["steps"].append({
-            "type": "key",
-            "value": key
-        })
-        self.show_recording_panel()
-
-    # ==================== SCROLL ====================
-
-    def show_scroll_options(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=8)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Dirección del scroll")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 5)
-
-        btn_down = Gtk.Button(label="Scroll ABAJO")
-        btn_down.connect("clicked", lambda x: self.show_scroll_amount("down"))
-        vbox.pack_start(btn_down, False, False, 0)
+    def sleep(self, seconds):
+        """Pausa corta entre acciones"""
+        time.sleep(seconds)
 
-        btn_up = Gtk.Button(label="Scroll ARRIBA")
-        btn_up.connect("clicked", lambda x: self.show_scroll_amount("up"))
-        vbox.pack_start(btn_up, False, False, 0)
+    def typing(self, text, is_password=False):
+        pass
 
-        btn_back = Gtk.Button(label="Volver")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        vbox.pack_end(btn_back, False, False, 10)
+    def clicked(self, x, y):
+        pass
 
-        self.add(vbox)
-        self.show_all()
-
-    def show_scroll_amount(self, direction):
-        self.scroll_direction = direction
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Cantidad de scroll (1-10)")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 0)
-
-        lbl2 = Gtk.Label(label="1 = poco, 5 = medio, 10 = mucho")
-        lbl2.get_style_context().add_class("info")
-        vbox.pack_start(lbl2, False, False, 0)
-
-        self.entry_scroll = Gtk.Entry()
-        self.entry_scroll.set_text("3")
-        vbox.pack_start(self.entry_scroll, False, False, 0)
-
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
+    def ask(self, prompt, password=False):
+        """Pide un valor al usuario. Retorna None si se cancela."""
+        return rofi_input(prompt, password)
 
-        btn_back = Gtk.Button(label="Cancelar")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        hbox.pack_start(btn_back, False, False, 0)
-
-        btn_ok = Gtk.Button(label="Agregar")
-        btn_ok.connect("clicked", self.add_scroll)
-        hbox.pack_start(btn_ok, False, False, 0)
-
-        vbox.pack_end(hbox, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-
-    def add_scroll(self, btn):
-        try:
-            amount = int(self.entry_scroll.get_text())
-            amount = max(1, min(10, amount))
-        except:
-            amount = 3
+    def confirm_mismatch(self, x, y, step_num):
+        return rofi_confirm("Workflow pausado",
+                            f"Paso {step_num}: el contexto ha cambiado en ({x}, {y})")
 
-        self.recording["steps"].append({
-            "type": "scroll",
-            "direction": self.scroll_direction,
-            "amount": amount
-        })
-        self.show_recording_panel()
+    def confirm_props_mismatch(self, x, y, step_num, saved_props, mismatches):
+        return rofi_confirm("Verificación de elemento",
+                            f"Paso {step_num}: " + "; ".join(mismatches or []))
 
-    # ==================== ESPERA ====================
+    def finish(self):
+        pass
 
-    def show_wait_dialog(self):
-        self.clear()
 
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
+class Runner:
+    """Ejecuta los pasos de un workflow guardado.
 
-        lbl = Gtk.Label(label="Segundos a esperar:")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 0)
+    No depende de GTK: toda la interacción visible pasa por `ui`
+    (HeadlessUI u OverlayUI) y el mouse/teclado por `input` (XTestInput o
+    XdotoolInput). run() retorna True si el workflow terminó y False si el
+    usuario lo canceló.
+    """
 
-        self.entry_wait = Gtk.Entry()
-        self.entry_wait.set_text("1")
-        vbox.pack_start(self.entry_wait, False, False, 0)
+    def __init__(self, ui, input=None):
+        self.ui = ui
+        self.input = input or make_input()
+        self.browser_window = None
 
-        hbox = Gtk.Box(spacing=6)
-        hbox.set_halign(Gtk.Align.END)
+    def run(self, data):
+        steps = data["steps"]
+        total = len(steps)
+        self.browser_window = None
 
-        btn_back = Gtk.Button(label="Cancelar")
-        btn_back.connect("clicked", lambda x: self.show_recording_panel())
-        hbox.pack_start(btn_back, False, False, 0)
+        for i, step in enumerate(steps):
+            handler = getattr(self, "step_" + step["type"], None)
+            if handler and handler(step, i + 1, total) is False:
+                self.ui.finish()
+                return False
+
+        self.ui.step("✅", "Completado", data["name"], total, total)
+        self.ui.sleep(0.8)
+        self.ui.finish()
+        return True
 
-        btn_ok = Gtk.Button(label="Agregar")
-        btn_ok.connect("clicked", self.add_wait)
-        hbox.pack_start(btn_ok, False, False, 0)
+    def activate_browser(self):
+        """Activa la ventana del navegador si la tenemos"""
+        if self.browser_window:
+            self.input.activate(self.browser_window)
+            self.ui.sleep(0.1)
 
-        vbox.pack_end(hbox, False, False, 0)
+    def step_url(self, step, n, total):
+        # Mostrar overlay: Abriendo navegador
+        self.ui.step("🌐", "Abriendo navegador", step["value"][:50], n, total)
+        subprocess.Popen(["xdg-open", step["value"]])
 
-        self.add(vbox)
-        self.show_all()
+        # Espera con countdown visual
+        self.ui.wait(2.5)
 
-    def add_wait(self, btn):
+        # Obtener ventana activa (debería ser el navegador)
         try:
-            secs = float(self.entry_wait.get_text())
+            self.browser_window = self.input.active_window()
         except:
-            secs = 1
-        self.recording["steps"].append({
-            "type": "wait",
-            "seconds": secs
-        })
-        self.show_recording_panel()
-
-    # ==================== GUARDAR ====================
-
-    def save_recording(self, btn):
-        name = self.recording["name"]
-        fname = "".join(c if c.isalnum() else "-" for c in name.lower())
-        path = SAVED_DIR / f"{fname}.json"
-        path.write_text(json.dumps(self.recording, indent=2))
-        self.show_main()
-
-    # ==================== EDITAR ====================
-
-    def show_edit_select(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Selecciona URL a editar")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 5)
-
-        for name, path in self.get_turls():
-            btn = Gtk.Button(label=name)
-            btn.connect("clicked", lambda x, p=path: self.show_edit_steps(p))
-            vbox.pack_start(btn, False, False, 0)
-
-        btn_back = Gtk.Button(label="Volver")
-        btn_back.connect("clicked", lambda x: self.show_main())
-        vbox.pack_end(btn_back, False, False, 10)
-
-        self.add(vbox)
-        self.show_all()
-
-    def show_edit_steps(self, path):
-        self.edit_path = path
-        data = json.loads(Path(path).read_text())
-        self.recording = data
-
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
-        vbox.set_margin_top(10)
-        vbox.set_margin_bottom(10)
-        vbox.set_margin_start(12)
-        vbox.set_margin_end(12)
-
-        lbl = Gtk.Label(label=f"Editando: {data['name']}")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 2)
-
-        # TreeView con drag and drop
-        scroll = Gtk.ScrolledWindow()
-        scroll.set_min_content_height(200)
-        scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-
-        # ListStore: index, descripción
-        self.steps_store = Gtk.ListStore(int, str)
-        for i, step in enumerate(data["steps"]):
-            desc = self._step_description(i, step)
-            self.steps_store.append([i, desc])
-
-        self.steps_tree = Gtk.TreeView(model=self.steps_store)
-        self.steps_tree.set_headers_visible(False)
-        self.steps_tree.set_reorderable(True)  # Drag and drop nativo
-        self.steps_store.connect("row-deleted", self.on_steps_reordered)
-
-        renderer = Gtk.CellRendererText()
-        column = Gtk.TreeViewColumn("Paso", renderer, text=1)
-        self.steps_tree.append_column(column)
-
-        scroll.add(self.steps_tree)
-        vbox.pack_start(scroll, True, True, 0)
-
-        # Botones
-        hbox_btns = Gtk.Box(spacing=4)
-        hbox_btns.set_halign(Gtk.Align.END)
-
-        btn_add = Gtk.Button(label="+ Paso")
-        btn_add.get_style_context().add_class("small-btn")
-        btn_add.connect("clicked", lambda x: self.add_step_to_edit())
-        hbox_btns.pack_start(btn_add, False, False, 0)
-
-        btn_back = Gtk.Button(label="Guardar")
-        btn_back.get_style_context().add_class("small-btn")
-        btn_back.connect("clicked", lambda x: self.save_edit())
-        hbox_btns.pack_start(btn_back, False, False, 0)
-
-        vbox.pack_end(hbox_btns, False, False, 0)
-
-        self.add(vbox)
-        self.show_all()
-
-    def _step_description(self, i, step):
-        """Genera descripción compacta de un paso"""
-        t = step["type"]
-        if t == "url":
-            return f"{i+1}. 🌐 {step['value'][:30]}"
-        elif t == "click":
-            return f"{i+1}. 👆 ({step['x']}, {step['y']})"
-        elif t == "input":
-            if "prompt" in step:
-                return f"{i+1}. ✏ [{step['prompt'][:15]}]"
-            else:
-                return f"{i+1}. ✏ \"{step.get('value', '')[:15]}\""
-        elif t == "key":
-            return f"{i+1}. ⌨ {step['value']}"
-        elif t == "password":
-            return f"{i+1}. 🔐 [{step['prompt'][:15]}]"
-        elif t == "scroll":
-            dir_txt = "↓" if step["direction"] == "down" else "↑"
-            return f"{i+1}. {dir_txt} x{step['amount']}"
-        elif t == "wait":
-            return f"{i+1}. ⏳ {step['seconds']}s"
-        return f"{i+1}. {t}"
-
-    def on_steps_reordered(self, model, path):
-        """Cuando se reordena con drag and drop"""
-        # Reconstruir el orden de pasos según el nuevo orden del ListStore
-        new_steps = []
-        for row in self.steps_store:
-            idx = row[0]
-            if idx < len(self.recording["steps"]):
-                new_steps.append(self.recording["steps"][idx])
-
-        if len(new_steps) == len(self.recording["steps"]):
-            self.recording["steps"] = new_steps
-            Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-            # Refrescar descripciones
-            GLib.idle_add(self._refresh_step_numbers)
-
-    def _refresh_step_numbers(self):
-        """Actualiza los números de paso después de reordenar"""
-        for i, row in enumerate(self.steps_store):
-            row[0] = i
-            row[1] = self._step_description(i, self.recording["steps"][i])
-
-    def delete_selected_step(self):
-        """Elimina el paso seleccionado"""
-        selection = self.steps_tree.get_selection()
-        model, treeiter = selection.get_selected()
-        if treeiter:
-            idx = model[treeiter][0]
-            if idx > 0:  # No eliminar URL inicial
-                del self.recording["steps"][idx]
-                Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-                self.show_edit_steps(self.edit_path)
-
-    def delete_step(self, idx):
-        del self.recording["steps"][idx]
-        Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-        self.show_edit_steps(self.edit_path)
-
-    def move_step_up(self, idx):
-        if idx > 1:
-            steps = self.recording["steps"]
-            steps[idx], steps[idx-1] = steps[idx-1], steps[idx]
-            Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-            self.show_edit_steps(self.edit_path)
-
-    def move_step_down(self, idx):
-        steps = self.recording["steps"]
-        if idx < len(steps) - 1:
-            steps[idx], steps[idx+1] = steps[idx+1], steps[idx]
-            Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-            self.show_edit_steps(self.edit_path)
-
-    def add_step_to_edit(self):
-        # Guardar y ir al panel de grabación
-        Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-        self.show_recording_panel()
-
-    def save_edit(self):
-        Path(self.edit_path).write_text(json.dumps(self.recording, indent=2))
-        self.show_main()
-
-    # ==================== ARCHIVAR ====================
-
-    def show_delete(self):
-        self.clear()
-
-        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
-        vbox.set_margin_top(15)
-        vbox.set_margin_bottom(15)
-        vbox.set_margin_start(15)
-        vbox.set_margin_end(15)
-
-        lbl = Gtk.Label(label="Selecciona URL a archivar")
-        lbl.get_style_context().add_class("title")
-        vbox.pack_start(lbl, False, False, 5)
-
-        for name, path in self.get_turls():
-            btn = Gtk.Button(label=name)
-            btn.connect("clicked", lambda x, p=path: self.confirm_delete(p))
-            vbox.pack_start(btn, False, False, 0)
-
-        btn_back = Gtk.Button(label="Volver")
-        btn_back.connect("clicked", lambda x: self.show_main())
-        vbox.pack_end(btn_back, False, False, 10)
-
-        self.add(vbox)
-        self.show_all()
-
-    def confirm_delete(self, path):
-        """Archivar workflow"""
-        archive_dir = SAVED_DIR / "archive"
-        archive_dir.mkdir(exist_ok=True)
-        src = Path(path)
-        dst = archive_dir / src.name
-        src.rename(dst)
-        self.show_main()
-
-    # ==================== EJECUTAR CON VISUALIZACIÓN ====================
-
-    def run_turl(self, path):
-        self.hide()
-        self._process_gtk_events()
-        time.sleep(0.1)  # Dar tiempo a que se oculte
-
-        data = json.loads(Path(path).read_text())
-        steps = data["steps"]
-        total_steps = len(steps)
-
-        browser_window = None
-
-        for i, step in enumerate(steps):
-            t = step["type"]
-
-            if t == "url":
-                # Mostrar overlay: Abriendo navegador
-                self.status_overlay.show_step(
-                    "🌐", "Abriendo navegador",
-                    step["value"][:50],
-                    i + 1, total_steps
-                )
-                subprocess.Popen(["xdg-open", step["value"]])
-
-                # Espera con countdown visual
-                self._visual_wait(2.5)
-
-                # Obtener ventana activa (debería ser el navegador)
-                try:
-                    result = subprocess.run(["xdotool", "getactivewindow"],
-                                          capture_output=True, text=True)
-                    browser_window = result.stdout.strip()
-                except:
-                    pass
-
-            elif t == "click":
-                # Usar porcentajes si están disponibles, sino absolutos (legacy)
-                if "px" in step and "py" in step:
-                    x, y = percent_to_coords(step["px"], step["py"])
-                else:
-                    x, y = step["x"], step["y"]
-
-                snap = step.get("snap")
-                props = step.get("props", {})
-
-                # Verificar propiedades del elemento (texto, color)
-                props_ok, mismatches = verify_element_properties(x, y, props)
-                if not props_ok:
-                    self.status_overlay.show_step(
-                        "⚠️", "Verificando elemento",
-                        "Propiedades no coinciden",
-                        i + 1, total_steps
-                    )
-                    if not self._show_props_mismatch_dialog(x, y, i + 1, props, mismatches):
-                        self.status_overlay.hide()
-                        Gtk.main_quit()
-                        return
-
-                # Verificar que el contexto visual coincide (snapshot)
-                elif snap and not compare_regions(snap, x, y):
-                    self.status_overlay.show_step(
-                        "⚠️", "Workflow pausado",
-                        "El contexto ha cambiado",
-                        i + 1, total_steps
-                    )
-                    if not self._show_mismatch_dialog(x, y, i + 1):
-                        self.status_overlay.hide()
-                        Gtk.main_quit()
-                        return
-
-                # Mostrar overlay: Click
-                click_desc = f"({x}, {y})"
-                if props.get("text"):
-                    click_desc = f"'{props['text'][:20]}'"
-                self.status_overlay.show_step(
-                    "👆", "Click",
-                    click_desc,
-                    i + 1, total_steps
-                )
-
-                # Activar ventana del navegador si la tenemos
-                if browser_window:
-                    subprocess.run(["xdotool", "windowactivate", "--sync", browser_window],
-                                 capture_output=True)
-                    self._sleep(0.1)
-
-                # Mover mouse y click
-                subprocess.run(["xdotool", "mousemove", "--sync", str(x), str(y)])
-                self._sleep(0.1)
-
-                # Mostrar indicador de click animado
-                GLib.idle_add(self.click_indicator.show_at, x, y)
-
-                # Hacer click
-                subprocess.run(["xdotool", "click", "1"])
-                self._sleep(0.4)
-
-            elif t == "input":
-                if "prompt" in step:
-                    # Mostrar overlay: Solicitando input
-                    self.status_overlay.show_step(
-                        "✏️", "Esperando input",
-                        step["prompt"],
-                        i + 1, total_steps
-                    )
-
-                    # Pedir input al usuario
-                    self.show()
-                    dialog = Gtk.Dialog(title=step["prompt"], parent=self)
-                    dialog.set_default_size(350, 100)
-
-                    entry = Gtk.Entry()
-                    entry.set_margin_top(10)
-                    entry.set_margin_bottom(10)
-                    entry.set_margin_start(10)
-                    entry.set_margin_end(10)
-                    dialog.get_content_area().add(entry)
-
-                    dialog.add_button("Cancelar", Gtk.ResponseType.CANCEL)
-                    dialog.add_button("OK", Gtk.ResponseType.OK)
-                    dialog.show_all()
-
-                    response = dialog.run()
-                    value = entry.get_text()
-                    dialog.destroy()
-                    self.hide()
-
-                    if response != Gtk.ResponseType.OK:
-                        self.status_overlay.hide()
-                        Gtk.main_quit()
-                        return
-                else:
-                    value = step.get("value", "")
-
-                # Mostrar overlay: Escribiendo
-                self.status_overlay.show_step(
-                    "⌨️", "Escribiendo",
-                    f"{len(value)} caracteres",
-                    i + 1, total_steps
-                )
-                self.status_overlay.show_typing(value, is_password=False)
-
-                # Activar ventana del navegador
-                if browser_window:
-                    subprocess.run(["xdotool", "windowactivate", "--sync", browser_window],
-                                 capture_output=True)
-                    self._sleep(0.1)
-
-                subprocess.run(["xdotool", "type", "--clearmodifiers", value])
-                self._sleep(0.2)
-
-            elif t == "password":
-                # Mostrar overlay: Solicitando contraseña
-                self.status_overlay.show_step(
-                    "🔐", "Contraseña requerida",
-                    step["prompt"],
-                    i + 1, total_steps
-                )
-
-                # Pedir contraseña
-                self.show()
-                dialog = Gtk.Dialog(title=step["prompt"], parent=self)
-                dialog.set_default_size(350, 100)
-
-                entry = Gtk.Entry()
-                entry.set_visibility(False)
-                entry.set_margin_top(10)
-                entry.set_margin_bottom(10)
-                entry.set_margin_start(10)
-                entry.set_margin_end(10)
-                dialog.get_content_area().add(entry)
-
-                dialog.add_button("Cancelar", Gtk.ResponseType.CANCEL)
-                dialog.add_button("OK", Gtk.ResponseType.OK)
-                dialog.show_all()
-
-                response = dialog.run()
-                value = entry.get_text()
-                dialog.destroy()
-                self.hide()
-
-                if response != Gtk.ResponseType.OK:
-                    self.status_overlay.hide()
-                    Gtk.main_quit()
-                    return
-
-                # Mostrar overlay: Escribiendo contraseña
-                self.status_overlay.show_step(
-                    "🔑", "Ingresando contraseña",
-                    "●●●●●●●●",
-                    i + 1, total_steps
-                )
-                self.status_overlay.show_typing(value, is_password=True)
-
-                # Activar ventana del navegador
-                if browser_window:
-                    subprocess.run(["xdotool", "windowactivate", "--sync", browser_window],
-                                 capture_output=True)
-                    self._sleep(0.1)
-
-                subprocess.run(["xdotool", "type", "--clearmodifiers", value])
-                self._sleep(0.2)
-
-            elif t == "key":
-                key_name = step["value"]
-                key_display = {
-                    "Return": "Enter ↵",
-                    "Tab": "Tab ⇥",
-                    "Escape": "Escape",
-                    "BackSpace": "Borrar ⌫",
-                    "space": "Espacio",
-                    "ctrl+a": "Ctrl+A",
-                    "ctrl+c": "Ctrl+C",
-                    "ctrl+v": "Ctrl+V",
-                }.get(key_name, key_name)
-
-                # Mostrar overlay: Presionando tecla
-                self.status_overlay.show_step(
-                    "⌨️", "Tecla",
-                    key_display,
-                    i + 1, total_steps
-                )
-
-                # Activar ventana del navegador
-                if browser_window:
-                    subprocess.run(["xdotool", "windowactivate", "--sync", browser_window],
-                                 capture_output=True)
-                    self._sleep(0.1)
-
-                subprocess.run(["xdotool", "key", "--clearmodifiers", key_name])
-                self._sleep(0.2)
-
-            elif t == "scroll":
-                direction = step["direction"]
-                amount = step["amount"]
-
-                dir_icon = "⬇️" if direction == "down" else "⬆️"
-                dir_text = "abajo" if direction == "down" else "arriba"
-
-                # Mostrar overlay: Scroll
-                self.status_overlay.show_step(
-                    dir_icon, f"Scroll {dir_text}",
-                    f"Cantidad: {amount}",
-                    i + 1, total_steps
-                )
-
-                # Activar ventana del navegador
-                if browser_window:
-                    subprocess.run(["xdotool", "windowactivate", "--sync", browser_window],
-                                 capture_output=True)
-                    self._sleep(0.1)
-
-                btn = "5" if direction == "down" else "4"
-                for _ in range(amount):
-                    subprocess.run(["xdotool", "click", btn])
-                    self._sleep(0.1)
-                self._sleep(0.3)
-
-            elif t == "wait":
-                seconds = step["seconds"]
-
-                # Mostrar overlay: Esperando con countdown
-                self.status_overlay.show_step(
-                    "⏳", "Esperando",
-                    f"{seconds} segundos",
-                    i + 1, total_steps
-                )
-
-                self._visual_wait(seconds)
-
-        # Finalizar
-        self.status_overlay.show_step(
-            "✅", "Completado",
-            data["name"],
-            total_steps, total_steps
-        )
-        self._sleep(0.8)
-        self.status_overlay.hide()
-
-        Gtk.main_quit()
-
-    def _visual_wait(self, seconds):
-        """Espera con countdown visual"""
-        start = time.time()
-        remaining = seconds
-
-        while remaining > 0:
-            self.status_overlay.show_countdown(remaining)
-            self._process_gtk_events()
-            time.sleep(0.05)
-            remaining = seconds - (time.time() - start)
-
-        self.status_overlay.show_countdown(0)
-
-    def _process_gtk_events(self):
-        """Procesa eventos GTK pendientes"""
-        while Gtk.events_pending():
-            Gtk.main_iteration_do(False)
-
-    def _sleep(self, seconds):
-        """Sleep que procesa eventos GTK"""
-        start = time.time()
-        while (time.time() - start) < seconds:
-            self._process_gtk_events()
-            time.sleep(0.02)
-
-    def _show_mismatch_dialog(self, x, y, step_num):
-        """Muestra diálogo cuando el contexto no coincide. Retorna True para continuar."""
-        self.show()
-        dialog = Gtk.Dialog(title="Workflow Pausado", parent=self)
-        dialog.set_default_size(400, 150)
-
-        content = dialog.get_content_area()
-        content.set_margin_top(15)
-        content.set_margin_bottom(10)
-        content.set_margin_start(15)
-        content.set_margin_end(15)
-
-        lbl = Gtk.Label()
-        lbl.set_markup(
-            f"<b>⚠️ El contexto ha cambiado</b>\n\n"
-            f"Paso {step_num}: Click en ({x}, {y})\n\n"
-            f"La pantalla no coincide con lo grabado.\n"
-            f"Esto puede ocurrir si ya estás logueado\n"
-            f"o si la página cambió."
-        )
-        lbl.set_line_wrap(True)
-        content.add(lbl)
-
-        dialog.add_button("Cancelar workflow", Gtk.ResponseType.CANCEL)
-        dialog.add_button("Continuar de todos modos", Gtk.ResponseType.OK)
-        dialog.show_all()
-
-        response = dialog.run()
-        dialog.destroy()
-        self.hide()
-
-        return response == Gtk.ResponseType.OK
-
-    def _show_props_mismatch_dialog(self, x, y, step_num, saved_props, mismatches):
-        """Muestra diálogo cuando las propiedades del elemento no coinciden."""
-        self.show()
-        dialog = Gtk.Dialog(title="Verificación de elemento", parent=self)
-        dialog.set_default_size(450, 200)
-
-        content = dialog.get_content_area()
-        content.set_margin_top(15)
-        content.set_margin_bottom(10)
-        content.set_margin_start(15)
-        content.set_margin_end(15)
-
-        # Construir mensaje
-        saved_text = saved_props.get("text", "?")
-        saved_color = saved_props.get("color", "?")
-
-        mismatch_text = "\n".join(f"• {m}" for m in mismatches) if mismatches else ""
-
-        lbl = Gtk.Label()
-        lbl.set_markup(
-            f"<b>⚠️ El elemento puede haber cambiado</b>\n\n"
-            f"Paso {step_num}: Click en ({x}, {y})\n\n"
-            f"<b>Esperaba:</b>\n"
-            f"  Texto: '{saved_text}'\n"
-            f"  Color: {saved_color}\n\n"
-            f"<b>Diferencias:</b>\n{mismatch_text}\n\n"
-            f"¿Es este el botón correcto?"
-        )
-        lbl.set_line_wrap(True)
-        lbl.set_xalign(0)
-        content.add(lbl)
-
-        dialog.add_button("Cancelar workflow", Gtk.ResponseType.CANCEL)
-        dialog.add_button("Sí, continuar", Gtk.ResponseType.OK)
-        dialog.show_all()
+            pass
 
-        response = dialog.run()
-        dialog.destroy()
-        self.hide()
+    def step_click(self, step, n, total):
+        # Usar porcentajes si están disponibles, sino absolutos (legacy)
+        if "px" in step and "py" in step:
+            x, y = percent_to_coords(step["px"], step["py"], self.input.screen_size())
+        else:
+            x, y = step["x"], step["y"]
+
+        snap = step.get("snap")
+        props = step.get("props", {})
+
+        # Verificar propiedades del elemento (texto, color) y el contexto
+        # visual (snapshot) con una sola captura
+        props_ok, mismatches, snap_ok = verify_click(
+            x, y, props, snap, step.get("snap_threshold"), step.get("snap_metric"),
+            step.get("snap_hash"))
+
+        # Self-healing: el elemento pudo moverse unos píxeles (layout distinto)
+        if snap and not (props_ok and snap_ok) and step.get("locate", True):
+            found = locate_snap(snap, x, y)
+            if found:
+                new_x, new_y, score = found
+                print(f"turls: paso {n}: elemento reubicado ({new_x - x:+d}, {new_y - y:+d}) "
+                      f"NCC {score:.2f}", file=sys.stderr)
+                x, y = new_x, new_y
+                props_ok, mismatches, _ = verify_click(x, y, props)
+                snap_ok = True
+
+        if not props_ok:
+            self.ui.step("⚠️", "Verificando elemento", "Propiedades no coinciden", n, total)
+            if not self.ui.confirm_props_mismatch(x, y, n, props, mismatches):
+                return False
+
+        # Verificar que el contexto visual coincide (snapshot)
+        elif not snap_ok:
+            self.ui.step("⚠️", "Workflow pausado", "El contexto ha cambiado", n, total)
+            if not self.ui.confirm_mismatch(x, y, n):
+                return False
+
+        # Mostrar overlay: Click
+        click_desc = f"({x}, {y})"
+        if props.get("text"):
+            click_desc = f"'{props['text'][:20]}'"
+        self.ui.step("👆", "Click", click_desc, n, total)
+
+        self.activate_browser()
+
+        # Mover mouse y click
+        self.input.move(x, y)
+        self.ui.sleep(0.1)
+
+        # Mostrar indicador de click animado
+        self.ui.clicked(x, y)
+
+        # Hacer click
+        self.input.click(1)
+        self.ui.sleep(0.4)
+
+    def step_input(self, step, n, total):
+        if "prompt" in step:
+            # Mostrar overlay: Solicitando input
+            self.ui.step("✏️", "Esperando input", step["prompt"], n, total)
+            value = self.ui.ask(step["prompt"])
+            if value is None:
+                return False
+        else:
+            value = step.get("value", "")
+
+        # Mostrar overlay: Escribiendo
+        self.ui.step("⌨️", "Escribiendo", f"{len(value)} caracteres", n, total)
+        self.ui.typing(value, is_password=False)
+        self.type_text(value)
+
+    def step_password(self, step, n, total):
+        # Mostrar overlay: Solicitando contraseña
+        self.ui.step("🔐", "Contraseña requerida", step["prompt"], n, total)
+        value = self.ui.ask(step["prompt"], password=True)
+        if value is None:
+            return False
 
-        return response == Gtk.ResponseType.OK
+        # Mostrar overlay: Escribiendo contraseña
+        self.ui.step("🔑", "Ingresando contraseña", "●●●●●●●●", n, total)
+        self.ui.typing(value, is_password=True)
+        self.type_text(value)
+
+    def type_text(self, value):
+        self.activate_browser()
+        self.input.type(value)
+        self.ui.sleep(0.2)
+
+    def step_key(self, step, n, total):
+        key_name = step["value"]
+
+        # Mostrar overlay: Presionando tecla
+        self.ui.step("⌨️", "Tecla", KEY_DISPLAY.get(key_name, key_name), n, total)
+
+        self.activate_browser()
+        self.input.key(key_name)
+        self.ui.sleep(0.2)
+
+    def step_scroll(self, step, n, total):
+        direction = step["direction"]
+        amount = step["amount"]
+
+        dir_icon = "⬇️" if direction == "down" else "⬆️"
+        dir_text = "abajo" if direction == "down" else "arriba"
+
+        # Mostrar overlay: Scroll
+        self.ui.step(dir_icon, f"Scroll {dir_text}", f"Cantidad: {amount}", n, total)
+
+        self.activate_browser()
+
+        # Todos los pasos de rueda en una sola llamada al backend
+        self.input.click(5 if direction == "down" else 4, repeat=amount)
+        self.ui.sleep(0.3)
+
+    def step_wait(self, step, n, total):
+        seconds = step["seconds"]
+
+        # Mostrar overlay: Esperando con countdown
+        self.ui.step("⏳", "Esperando", f"{seconds} segundos", n, total)
+        self.ui.wait(seconds)
+
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="TURLS - grabador y ejecutor de navegación")
+    parser.add_argument("--list", action="store_true",
+                        help="listar los workflows guardados y salir")
+    sub = parser.add_subparsers(dest="command")
+    run = sub.add_parser("run", help="ejecutar un workflow sin la ventana principal")
+    run.add_argument("name", help="nombre, nombre de archivo o ruta del workflow")
+    run.add_argument("--overlay", action="store_true",
+                     help="mostrar el overlay de estado (carga GTK)")
+    sub.add_parser("show", help="mostrar la ventana principal (por defecto)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="modo residente: esperar órdenes en el socket")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="no delegar en el turls residente aunque esté corriendo")
+    parser.add_argument("--input", choices=INPUT_BACKENDS,
+                        help="backend de mouse/teclado (por defecto $TURLS_INPUT o auto: "
+                             "XTEST en proceso si hay python-xlib, si no xdotool)")
+    args = parser.parse_args(argv)
+    # Solo el backend pedido explícitamente se reenvía al turls residente;
+    # si no, se usa el suyo
+    args.input_requested = args.input or os.environ.get("TURLS_INPUT")
+    args.input = args.input_requested or "auto"
+    return args
+
+
+def cli_list():
+    for name, path in list_turls():
+        steps = len(load_turl(path)["steps"])
+        print(f"{Path(path).stem}\t{name}\t{steps} pasos")
+    return 0
+
+
+def cli_run(name, ui_class, input_backend="auto"):
+    """Ejecuta un workflow por nombre. Código de salida: 0 ok, 1 cancelado, 2 no existe."""
+    path = find_turl(name)
+    if not path:
+        print(f"URL no encontrado: {name}", file=sys.stderr)
+        return 2
+    runner = Runner(ui_class(), make_input(input_backend))
+    return 0 if runner.run(load_turl(path)) else 1
+
+
+def daemon_request(*args):
+    """Envía una orden al turls residente. Retorna la respuesta o None si no corre.
+
+    Solo "no corre" si no se pudo conectar: una vez conectado, la orden pudo
+    haber llegado, así que un timeout o una conexión cortada sin respuesta
+    se informan como error (volver a ejecutarla localmente la duplicaría).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        try:
+            sock.connect(SOCKET_PATH)
+        except OSError:
+            return None
+        try:
+            sock.sendall((shlex.join(args) + "\n").encode())
+            reply = sock.makefile("rb").readline()
+        except OSError as e:
+            return {"ok": False, "error": f"el turls residente no respondió: {e}"}
+    if not reply:
+        return {"ok": False, "error": "el turls residente cortó la conexión sin responder"}
+    return json.loads(reply)
+
+
+def load_gtk():
+    """Importa la interfaz GTK (turls_gtk.py) la primera vez que se necesita"""
+    # turls_gtk importa este módulo por nombre: que reciba esta misma copia
+    # (con sus cachés y backends ya cargados) en vez de ejecutarlo de nuevo
+    sys.modules.setdefault("turls", sys.modules[__name__])
+    import turls_gtk
+    return turls_gtk
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        return cli_list()
+    if not args.daemon and not args.no_daemon:
+        # Si hay un turls residente, solo enviarle la orden (con sus opciones)
+        if args.command == "run":
+            request = ["run", args.name] + (["--overlay"] if args.overlay else [])
+        else:
+            request = ["show"]
+        if args.input_requested:
+            request += ["--input", args.input_requested]
+        reply = daemon_request(*request)
+        if reply is not None:
+            if not reply.get("ok"):
+                print(reply.get("error", "error"), file=sys.stderr)
+            return 0 if reply.get("ok") else 1
+    if args.command == "run" and not args.overlay:
+        # Camino rápido: sin GTK, cairo ni ventana principal
+        return cli_run(args.name, HeadlessUI, args.input)
+
+    gtk = load_gtk()
+    if args.daemon:
+        return gtk.run_daemon(args.input)
+    if args.command == "run":
+        # run --overlay: solo el overlay de estado, sin ventana principal
+        return cli_run(args.name, gtk.OverlayUI, args.input)
+    return gtk.run_app(args.input)
 
 
 if __name__ == "__main__":
-    app = TurlsApp()
-    app.connect("destroy", Gtk.main_quit)
-    app.show_all()
-    Gtk.main()
+    sys.exit(main())
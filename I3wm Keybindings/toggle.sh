@@ -3,9 +3,21 @@
 DIR="$(cd "$(dirname "$0")" && pwd)"
 WINDOW_NAME="i3 Keybindings HUD"
 OVERLAY_FILE="/tmp/i3_active_overlay"
+TRACKER="$HOME/.config/i3/tracker-client.py"
+
+# Find an X window id by title: ask window-tracker.py (in-memory tree
+# mirror) first, fall back to scanning X with xdotool
+find_window() {
+    local reply
+    if reply=$("$TRACKER" windows "title~$1" 2>/dev/null); then
+        echo "$reply" | jq -r '.windows[0].window // empty'
+    else
+        xdotool search --name "$1" 2>/dev/null | head -1
+    fi
+}
 
 # Check if our own window is open → toggle off
-WID=$(xdotool search --name "$WINDOW_NAME" 2>/dev/null | head -1)
+WID=$(find_window "$WINDOW_NAME")
 if [ -n "$WID" ]; then
     xdotool windowclose "$WID"
     rm -f "$OVERLAY_FILE"
@@ -16,7 +28,7 @@ fi
 if [ -f "$OVERLAY_FILE" ]; then
     ACTIVE=$(cat "$OVERLAY_FILE")
     if [ -n "$ACTIVE" ]; then
-        ACTIVE_WID=$(xdotool search --name "$ACTIVE" 2>/dev/null | head -1)
+        ACTIVE_WID=$(find_window "$ACTIVE")
         [ -n "$ACTIVE_WID" ] && xdotool windowclose "$ACTIVE_WID"
     fi
     rm -f "$OVERLAY_FILE"
@@ -36,7 +48,7 @@ google-chrome \
 # Wait for window and force fullscreen
 for i in $(seq 1 20); do
     sleep 0.1
-    WID=$(xdotool search --name "$WINDOW_NAME" 2>/dev/null | head -1)
+    WID=$(find_window "$WINDOW_NAME")
     if [ -n "$WID" ]; then
         i3-msg "[id=$WID] floating enable, border none, fullscreen enable" >/dev/null 2>&1
         break